@@ -0,0 +1,171 @@
+"""Benchmarks for the overhead of WoLo itself.
+
+All tasks of the synthetic workflows do nothing, so the measured times are only spent in WoLo (creating Tasks and
+their Parameters, checking them, scheduling, writing and loading the log). The tasks have a Parameter, a Source and
+an input and an output File each, like a typical real task.
+
+Shapes of the tasktree:
+- sequence: all tasks one after another
+- wide: one parallel group with a branch per task
+- nested: nested Workflows with 100 tasks each
+
+Measured steps:
+- construct: creating all Tasks of the tree
+- workflow_init: creating the Workflow (creating the tree and checking all files)
+- first_run: Workflow.run() with an empty log (all tasks rerun)
+- second_run: Workflow.run() with a complete log (no task reruns, only comparing and scheduling)
+- log_write: writing the whole log into a new log for every log backend
+- log_load: loading the log and accessing all TaskLogs for every log backend
+- flat_view: creating a FlatView of the log
+
+The results are printed (or written to --output) as JSON, so they can be compared between versions:
+    python benchmarks/bench_overhead.py --sizes 1000,10000 --output results.json
+Use --sizes 100000 to run the large workflows (this takes a while).
+"""
+
+###############################################################################
+# These lines are not needed if you run the script with WoLo installed on your system
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')))
+###############################################################################
+
+import argparse
+import contextlib
+import itertools
+import json
+import platform
+import statistics
+import tempfile
+import timeit
+
+import wolo
+import wolo.log
+
+
+def noop(x):
+    return x
+
+
+class NoopTask(wolo.Task):
+    def input(self):
+        return [wolo.Parameter("i", self.args[1]), wolo.Source("function", noop),
+                wolo.File("in", os.path.join(self.args[0], "in_{}".format(self.args[1])), autocreate=True)]
+
+    def output(self):
+        return wolo.File("out", os.path.join(self.args[0], "out_{}".format(self.args[1])), autocreate=True)
+
+    def action(self):
+        pass
+
+    def success(self):
+        return True
+
+
+class SyntheticWorkflow(wolo.Workflow):
+    def tasktree(self):
+        return self.kwargs["tree"]()
+
+
+def build_tree(shape, size, folder):
+    """Return a function, which creates the tasktree of the given shape with size tasks"""
+    def sequence():
+        return [NoopTask(folder, i) for i in range(size)]
+
+    def wide():
+        return [[[NoopTask(folder, i)] for i in range(size)]]
+
+    def sub_tree(start):
+        return lambda: [NoopTask(folder, i) for i in range(start, min(start + 100, size))]
+
+    def nested():
+        return [SyntheticWorkflow(str(start), folder, tree=sub_tree(start)) for start in range(0, size, 100)]
+
+    return {"sequence": sequence, "wide": wide, "nested": nested}[shape]
+
+
+def measure(func, repeat, setup=None):
+    """Run func repeat times and return the min and the median runtime.
+
+    setup is called (untimed) before every repetition and its result is passed to func.
+    """
+    times = []
+    for _ in range(repeat):
+        args = () if setup is None else (setup(),)
+        start_time = timeit.default_timer()
+        func(*args)
+        times.append(timeit.default_timer() - start_time)
+    return {"min": min(times), "median": statistics.median(times), "repeat": repeat}
+
+
+def bench_workflow(shape, size, repeat, folder):
+    results = {}
+    tree = build_tree(shape, size, folder)
+    results["construct"] = measure(tree, repeat)
+
+    def new_workflow(name):
+        return SyntheticWorkflow("{}_{}".format(shape, name), folder, tree=tree)
+
+    def run(workflow):
+        workflow.run(return_result=True)
+
+    results["workflow_init"] = measure(lambda: new_workflow("init"), repeat)
+    # Every repetition of the first run needs a new (empty) log. The workflows are created outside of the timer, so
+    # that only the run (checking and scheduling) is measured.
+    run_ids = itertools.count()
+    results["first_run"] = measure(run, repeat, setup=lambda: new_workflow("first_{}".format(next(run_ids))))
+    run(new_workflow("second"))
+    results["second_run"] = measure(run, repeat, setup=lambda: new_workflow("second"))
+    return results
+
+
+def bench_log(shape, size, repeat, folder):
+    results = {}
+    task_log = SyntheticWorkflow("{}_second".format(shape), folder, tree=lambda: []).log.log
+    for backend in wolo.log.backends:
+        # Every repetition writes a new log, as the record based backends only write what changed
+        log_ids = itertools.count()
+
+        def new_log(name):
+            return wolo.log.Log("bench_{}_{}".format(backend, name), folder, backend=backend)
+
+        results["log_write_{}".format(backend)] = measure(lambda log: log._set_log(task_log), repeat,
+                                                          setup=lambda: new_log(next(log_ids)))
+        results["log_load_{}".format(backend)] = measure(lambda log: list(wolo.log.FlatView(log._load())), repeat,
+                                                         setup=lambda: new_log(0))
+    results["flat_view"] = measure(lambda: wolo.log.FlatView(task_log), repeat)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,10000", help="comma separated numbers of tasks")
+    parser.add_argument("--shapes", default="sequence,wide,nested", help="comma separated shapes of the tasktree")
+    parser.add_argument("--repeat", type=int, default=3, help="number of repetitions of every measurement")
+    parser.add_argument("--threads", type=int, default=1, help="see wolo.set_Threads")
+    parser.add_argument("--output", help="write the results to this file instead of printing them")
+    args = parser.parse_args()
+
+    wolo.set_Threads(args.threads)
+    results = []
+    for size in [int(size) for size in args.sizes.split(",")]:
+        for shape in args.shapes.split(","):
+            with tempfile.TemporaryDirectory() as folder, open(os.devnull, "w") as devnull:
+                with contextlib.redirect_stdout(devnull):
+                    measurements = bench_workflow(shape, size, args.repeat, folder)
+                    measurements.update(bench_log(shape, size, args.repeat, folder))
+            for benchmark, times in measurements.items():
+                results.append(dict(benchmark=benchmark, shape=shape, size=size, **times))
+            print("finished {} {}".format(shape, size), file=sys.stderr)
+
+    report = {"python": platform.python_version(), "platform": platform.platform(), "threads": args.threads,
+              "results": results}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
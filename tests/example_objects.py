@@ -17,12 +17,18 @@ example_log.append([sublog1, sublog2])
 example_log.append(log.TaskLog(index=[2], task_class="2", last_run_success=True))
 
 example_flat_view = log.FlatView(example_log)
-example_flat_output = {"0": {"index": [0], "task_class": "0", "last_run_success": True, "inputs": {}, "outputs": {}, "info": {}, "last_run": None, "execution_time": None},
-                       "1_p0_0": {"index": [1, "p0", 0], "task_class": "1_0_0", "last_run_success": True, "inputs": {}, "outputs": {}, "info": {}, "last_run": None, "execution_time": None},
-                       "1_p0_1": {"index": [1, "p0", 1], "task_class": "1_0_1", "last_run_success": True, "inputs": {}, "outputs": {}, "info": {}, "last_run": None, "execution_time": None},
-                       "1_p1_0": {"index": [1, "p1", 0], "task_class": "1_1_0", "last_run_success": False, "inputs": {}, "outputs": {}, "info": {}, "last_run": None, "execution_time": None},
-                       "1_p1_1": {"index": [1, "p1", 1], "task_class": "1_1_1", "last_run_success": True, "inputs": {}, "outputs": {}, "info": {}, "last_run": None, "execution_time": None},
-                       "2": {"index": [2], "task_class": "2", "last_run_success": True, "inputs": {}, "outputs": {}, "info": {}, "last_run": None, "execution_time": None}}
+example_flat_output = {"0": {"index": [0], "task_class": "0", "last_run_success": True, "inputs": {}, "outputs": {}, "info": {}, "last_run": None, "execution_time": None,
+                             "phases": None, "cpu_time": None, "child_cpu_time": None, "max_rss": None, "child_max_rss": None, "output": None},
+                       "1_p0_0": {"index": [1, "p0", 0], "task_class": "1_0_0", "last_run_success": True, "inputs": {}, "outputs": {}, "info": {}, "last_run": None, "execution_time": None,
+                             "phases": None, "cpu_time": None, "child_cpu_time": None, "max_rss": None, "child_max_rss": None, "output": None},
+                       "1_p0_1": {"index": [1, "p0", 1], "task_class": "1_0_1", "last_run_success": True, "inputs": {}, "outputs": {}, "info": {}, "last_run": None, "execution_time": None,
+                             "phases": None, "cpu_time": None, "child_cpu_time": None, "max_rss": None, "child_max_rss": None, "output": None},
+                       "1_p1_0": {"index": [1, "p1", 0], "task_class": "1_1_0", "last_run_success": False, "inputs": {}, "outputs": {}, "info": {}, "last_run": None, "execution_time": None,
+                             "phases": None, "cpu_time": None, "child_cpu_time": None, "max_rss": None, "child_max_rss": None, "output": None},
+                       "1_p1_1": {"index": [1, "p1", 1], "task_class": "1_1_1", "last_run_success": True, "inputs": {}, "outputs": {}, "info": {}, "last_run": None, "execution_time": None,
+                             "phases": None, "cpu_time": None, "child_cpu_time": None, "max_rss": None, "child_max_rss": None, "output": None},
+                       "2": {"index": [2], "task_class": "2", "last_run_success": True, "inputs": {}, "outputs": {}, "info": {}, "last_run": None, "execution_time": None,
+                             "phases": None, "cpu_time": None, "child_cpu_time": None, "max_rss": None, "child_max_rss": None, "output": None}}
 
 
 class ExampleTask(task.Task):
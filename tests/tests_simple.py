@@ -9,6 +9,9 @@ sys.path.insert(0, os.path.abspath('..'))
 
 
 import wolo.helper as helper
+import asyncio
+import contextvars
+import threading
 class TestHelperFunctions(unittest.TestCase):
 
     def test_pretty_print_index_brackets(self):
@@ -43,11 +46,28 @@ class TestHelperFunctions(unittest.TestCase):
         output = list(helper.cut_or_pad(test_master, test_slave, enum=True))
         self.assertEqual(exspected_output, output)
 
+    def test_to_thread(self):
+        variable = contextvars.ContextVar("test")
+
+        async def main():
+            variable.set("value")
+            return await helper.to_thread(lambda arg: (variable.get(), arg, threading.current_thread()), "arg")
+
+        value, arg, thread = asyncio.run(main())
+        self.assertEqual((value, arg), ("value", "arg"))
+        self.assertIsNot(thread, threading.current_thread())
+
 
 import wolo.parameters as parameters
+import wolo.cache as cache
 from example_objects import test_func
 import hashlib
+import stat
+import subprocess
+import tempfile
 class TestParamterDefinitions(unittest.TestCase):
+    def setUp(self):
+        parameters._source_cache.clear()
 
     def test_simple_parameter(self):
         test_parameter = parameters.Parameter("test", 4)
@@ -63,6 +83,7 @@ class TestParamterDefinitions(unittest.TestCase):
     @mock.patch("wolo.parameters.Path.stat")
     def test_file_parameter(self, getmtime_mock, isfile_mock):
         type(getmtime_mock.return_value).st_mtime = mock.PropertyMock(return_value=11111)
+        type(getmtime_mock.return_value).st_mode = mock.PropertyMock(return_value=stat.S_IFREG)
         test_file = parameters.File("test", "../test_dir/test")
         self.assertEqual(test_file.name, "test")
         self.assertEqual(test_file.value, str(Path("../test_dir/test")))
@@ -72,6 +93,7 @@ class TestParamterDefinitions(unittest.TestCase):
     @mock.patch("wolo.parameters.Path.stat")
     def test_file_parameter_changed(self, getmtime_mock, isfile_mock):
         type(getmtime_mock.return_value).st_mtime = mock.PropertyMock(return_value=11111)
+        type(getmtime_mock.return_value).st_mode = mock.PropertyMock(return_value=stat.S_IFREG)
         test_file = parameters.File("test", "../test_dir/test")
         type(getmtime_mock.return_value).st_mtime = mock.PropertyMock(return_value=22222)
         self.assertEqual(test_file._get_mod_date(), 22222)
@@ -82,11 +104,89 @@ class TestParamterDefinitions(unittest.TestCase):
     @mock.patch("wolo.parameters.Path.mkdir")
     @mock.patch("wolo.parameters.Path.open")
     def test_file_parameter_autocreate(self, open_mock, makedirs_mock, getmtime_mock, isfile_mock):
-        getmtime_mock.st_mtime = 11111
+        getmtime_mock.side_effect = [FileNotFoundError(), mock.Mock(st_mtime=11111, st_mode=stat.S_IFREG)]
         test_file = parameters.File("test", "../test_dir/test", autocreate=True)
         self.assertTrue(makedirs_mock.called)
         self.assertTrue(open_mock.called)
 
+    def test_file_parameter_hash(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            test_path = Path(tmp_dir) / "test"
+            test_path.write_bytes(b"test content")
+            with mock.patch("wolo.parameters.get_hash_cache", return_value=cache.HashCache(Path(tmp_dir) / ".hash_cache")):
+                test_file = parameters.File("test", test_path, use_hash=True)
+                self.assertEqual(test_file._log_value, [str(test_path), cache.hash_file(test_path)])
+                os.utime(str(test_path), ns=(1, 1))
+                self.assertFalse(test_file.changed())
+                test_path.write_bytes(b"changed content")
+                self.assertTrue(test_file.changed())
+
+    def test_file_parameter_prefetch(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            paths = [Path(tmp_dir) / "file_{}".format(i) for i in range(5)]
+            for path in paths:
+                path.write_text("test")
+            missing = Path(tmp_dir) / "missing"
+            created = Path(tmp_dir) / "sub" / "created"
+            with mock.patch("wolo.parameters.os.scandir", wraps=os.scandir) as scandir_mock:
+                with parameters.prefetch(threads=2):
+                    files = [parameters.File(path.name, path) for path in paths + [missing]]
+                    files.append(parameters.File("created", created, autocreate=True))
+                    self.assertEqual(files[0]._log_value, [str(paths[0]), parameters._pending_state])
+            # Folders are only listed on Windows, where the listing carries the stat results
+            self.assertEqual(scandir_mock.call_count, 1 if os.name == "nt" else 0)
+            self.assertEqual([file._log_value for file in files],
+                             [[str(path), path.stat().st_mtime] for path in paths] +
+                             [[str(missing), None], [str(created), created.stat().st_mtime]])
+            self.assertFalse(any(file.changed() for file in files))
+            # Files with use_hash are never taken from the listing
+            with mock.patch("wolo.parameters._stat_directory", return_value={}) as stat_directory_mock, \
+                    mock.patch("wolo.parameters.get_hash_cache"):
+                parameters._fingerprint_folder(tmp_dir, [(parameters.File(path.name, path, use_hash=i == 0), False)
+                                                         for i, path in enumerate(paths)])
+            stat_directory_mock.assert_called_once_with(tmp_dir, {path.name for path in paths[1:]})
+            stats = parameters._stat_directory(tmp_dir, {"file_0", "missing", "sub"})
+            self.assertEqual(stats, {"file_0": mock.ANY, "sub": None})
+            self.assertEqual(stats["file_0"].st_mtime, paths[0].stat().st_mtime)
+
+    def test_file_parameter_prefetch_errors(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            not_a_folder = Path(tmp_dir) / "file"
+            not_a_folder.write_text("test")
+            with contextlib.redirect_stderr(io.StringIO()) as stderr:
+                with parameters.prefetch():
+                    broken = parameters.File("broken", not_a_folder / "sub" / "out", autocreate=True)
+                    working = parameters.File("working", not_a_folder)
+            # Only the failing file is affected
+            self.assertIn("Traceback", stderr.getvalue())
+            self.assertEqual(broken._log_value, [str(not_a_folder / "sub" / "out"), None])
+            self.assertEqual(working._log_value, [str(not_a_folder), not_a_folder.stat().st_mtime])
+            # The files are not checked, if the block raised
+            with mock.patch("wolo.parameters._fingerprint") as fingerprint_mock:
+                with self.assertRaises(KeyError):
+                    with parameters.prefetch():
+                        parameters.File("working", not_a_folder)
+                        raise KeyError("test")
+            self.assertFalse(fingerprint_mock.called)
+
+    def test_hash_cache_persistent(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            test_path = Path(tmp_dir) / "test"
+            test_path.write_bytes(b"test content")
+            digest = cache.HashCache(Path(tmp_dir) / ".hash_cache").digest(test_path)
+            with mock.patch("wolo.cache.hash_file") as hash_mock:
+                self.assertEqual(cache.HashCache(Path(tmp_dir) / ".hash_cache").digest(test_path), digest)
+                self.assertFalse(hash_mock.called)
+
+    @mock.patch("wolo.cache.chunk_size", 4)
+    def test_hash_file_chunks(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            test_path = Path(tmp_dir) / "test"
+            test_path.write_bytes(b"0123456789")
+            parallel_hash = cache.hash_file(test_path)
+            with mock.patch("wolo.cache.hash_threads", 1):
+                self.assertEqual(cache.hash_file(test_path), parallel_hash)
+
     @mock.patch("wolo.parameters.inspect.getsource", return_value="this is a test")
     def test_source_parameter(self, getsource_mock):
         test_object = parameters.Source("test", test_func)
@@ -95,11 +195,21 @@ class TestParamterDefinitions(unittest.TestCase):
         self.assertEqual(test_object._log_value, ["test_func", hashlib.md5("this is a test".encode('utf-8')).hexdigest()])
 
     @mock.patch("wolo.parameters.inspect.getsource", return_value="this is a test")
-    def test_source_parameter_changed(self, getsource_mock):
+    @mock.patch("wolo.parameters._source_file_state", return_value=("test.py", 1, 1))
+    def test_source_parameter_changed(self, file_state_mock, getsource_mock):
         test_object = parameters.Source("test", test_func)
         getsource_mock.return_value = "this is changed test"
+        self.assertFalse(test_object.changed())
+        file_state_mock.return_value = ("test.py", 2, 1)
         self.assertTrue(test_object.changed())
 
+    @mock.patch("wolo.parameters.inspect.getsource", return_value="this is a test")
+    def test_source_parameter_cached(self, getsource_mock):
+        parameters.Source("test", test_func)
+        test_object = parameters.Source("test", test_func)
+        self.assertFalse(test_object.changed())
+        self.assertEqual(getsource_mock.call_count, 1)
+
     @mock.patch("wolo.parameters.Source.__init__")
     def test_self_paramter(self, source_mock):
         test_object = parameters.Self(list())
@@ -108,6 +218,17 @@ class TestParamterDefinitions(unittest.TestCase):
 
 import wolo.workflow as workflow
 import wolo.log as log
+import pickle
+import wolo.task as task
+import wolo.remote as remote
+import collections
+import contextlib
+import functools
+import itertools
+import io
+import multiprocessing
+import time
+from wolo.helper import TaskProperty
 
 class ExampleWorkflow(workflow.Workflow):
     def tasktree(self):
@@ -123,6 +244,109 @@ class MockTask():
         return log.TaskLog(index=[], task_class=self.name, last_run_success=self.success)
 
 
+class ResourceTask(MockTask):
+    used = {}
+    max_used = {}
+    lock = threading.Lock()
+
+    def __init__(self, success, name, **resources):
+        super().__init__(success, name)
+        self.resources = resources
+
+    def _run(self, x):
+        with ResourceTask.lock:
+            for name, need in self.resources.items():
+                ResourceTask.used[name] = ResourceTask.used.get(name, 0) + need
+                ResourceTask.max_used[name] = max(ResourceTask.used[name], ResourceTask.max_used.get(name, 0))
+        time.sleep(0.05)
+        with ResourceTask.lock:
+            for name, need in self.resources.items():
+                ResourceTask.used[name] -= need
+        return super()._run(x)
+
+
+class UnpicklableTask(MockTask):
+    def __getstate__(self):
+        raise TypeError("Task was pickled")
+
+
+class CrashTask():
+    def __init__(self, crash=False):
+        self.crash = crash
+        self.reran = False
+
+    def _run(self, x):
+        if x.last_run_success is True:
+            return x
+        if self.crash is True:
+            raise KeyboardInterrupt
+        self.reran = True
+        return log.TaskLog(index=[], task_class="CrashTask", last_run_success=True)
+
+
+class FileTask():
+    def __init__(self, success, name, inputs=(), outputs=()):
+        self.success = success
+        self.name = name
+        self.inputs = TaskProperty({path: parameters.File(path, path) for path in inputs})
+        self.outputs = TaskProperty({path: parameters.File(path, path) for path in outputs})
+        self.ran = False
+
+    def _run(self, x):
+        self.ran = True
+        return log.TaskLog(index=[], task_class=self.name, last_run_success=self.success)
+
+
+class AsyncTask(task.Task):
+    running = 0
+    max_running = 0
+
+    def input(self):
+        return parameters.Parameter("input", self.args[0])
+
+    def output(self):
+        return []
+
+    async def action(self):
+        AsyncTask.running += 1
+        AsyncTask.max_running = max(AsyncTask.running, AsyncTask.max_running)
+        output = await task.acmd(["echo", str(self.args[0])])
+        AsyncTask.running -= 1
+        return output
+
+    async def success(self):
+        return self.report == "{}\n".format(self.args[0]).encode()
+
+
+class PlanTask(task.Task):
+    def input(self):
+        return [parameters.Parameter("x", self.args[0])] + [parameters.File(path, path) for path in self.kwargs.get("inputs", [])]
+
+    def output(self):
+        return [parameters.File(path, path, autocreate=True) for path in self.kwargs.get("outputs", [])]
+
+    def action(self):
+        pass
+
+    def success(self):
+        return True
+
+
+class CachedTask(PlanTask):
+    artifact_cache = True
+
+    def input(self):
+        return [parameters.File("in", self.args[0], use_hash=True)]
+
+    def output(self):
+        return [parameters.File("out", self.args[1], autocreate=True)]
+
+
+class PlanWorkflow(workflow.Workflow):
+    def tasktree(self):
+        return self.args[0]
+
+
 class TestWorkflow(unittest.TestCase):
     @mock.patch("wolo.workflow.Workflow.before")
     @mock.patch("wolo.workflow.Log.__init__", return_value=None)
@@ -398,6 +622,353 @@ class TestWorkflow(unittest.TestCase):
         self.assertEqual(task_log, out_log)
 
 
+    def test_run_tasks_resume_from_checkpoint(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            checkpoint = log.Checkpoint(Path(tmp_dir) / ".test.checkpoint")
+            with self.assertRaises(KeyboardInterrupt):
+                workflow._run_tasks([CrashTask(), CrashTask(crash=True)], [], context=workflow._RunContext(checkpoint))
+            tree = [CrashTask(), CrashTask()]
+            success, task_log = workflow._run_tasks(tree, [], context=workflow._RunContext(checkpoint))
+            self.assertEqual(success, True)
+            self.assertFalse(tree[0].reran)
+            self.assertTrue(tree[1].reran)
+            self.assertEqual(task_log[0], log.TaskLog(index=[0], task_class="CrashTask", last_run_success=True))
+
+    def test_run_dag_log_layout(self):
+        tree = []
+        tree.append(FileTask(True, "0", outputs=["f0"]))
+        tree.append([[FileTask(True, "1_0_0", inputs=["f0"], outputs=["f1"])], [FileTask(True, "1_1_0")]])
+        tree.append(FileTask(True, "2", inputs=["f1"]))
+        success, task_log = workflow._run_dag(tree, [])
+        tree = [MockTask(True, "0"), [[MockTask(True, "1_0_0")], [MockTask(True, "1_1_0")]], MockTask(True, "2")]
+        self.assertEqual(success, True)
+        self.assertEqual(task_log, workflow._run_tasks(tree, [])[1])
+
+    def test_run_dag_edges(self):
+        tree = [FileTask(True, "0", outputs=["f0"]), FileTask(True, "1", inputs=["f0"], outputs=["f1"]),
+                FileTask(True, "2"), FileTask(True, "3", inputs=["f0", "f1"])]
+        nodes = workflow._collect_nodes(tree, [])[1]
+        workflow._link_nodes(nodes)
+        self.assertEqual([successor.step for successor in nodes[0].successors], [tree[1], tree[3]])
+        self.assertEqual([node.num_predecessors for node in nodes], [0, 1, 0, 2])
+
+    def test_run_dag_fail(self):
+        tree = [FileTask(False, "0", outputs=["f0"]), FileTask(True, "1", inputs=["f0"], outputs=["f1"]),
+                FileTask(True, "2"), FileTask(True, "3", inputs=["f1"])]
+        success, task_log = workflow._run_dag(tree, [])
+        self.assertEqual(success, False)
+        self.assertEqual([task.ran for task in tree], [True, False, True, False])
+        self.assertEqual(task_log[1], log.TaskLog(index=[1], task_class="FileTask", last_run_success=None))
+        self.assertEqual(task_log[2], log.TaskLog(index=[2], task_class="2", last_run_success=True))
+
+    def test_run_tasks_keep_going(self):
+        tree = [FileTask(False, "0", outputs=["f0"]), FileTask(True, "1", inputs=["f0"], outputs=["f1"]),
+                [[FileTask(True, "2_0_0")], [FileTask(True, "2_1_0", inputs=["f1"])]]]
+        failures = workflow._Failures()
+        executor = workflow._Executor(2)
+        try:
+            context = workflow._RunContext(executor=executor, failures=failures)
+            success, task_log = workflow._run_tasks(tree, [], context=context)
+        finally:
+            executor.close()
+        self.assertEqual(success, False)
+        self.assertEqual([tree[0].ran, tree[1].ran, tree[2][0][0].ran, tree[2][1][0].ran], [True, False, True, False])
+        self.assertEqual(failures.failed, {"0": "FileTask"})
+        self.assertEqual(set(failures.skipped), {"1", "2_p1"})
+        self.assertEqual(task_log[1], log.TaskLog(index=[1], task_class="FileTask", last_run_success=None))
+
+    def test_run_tasks_shared_executor(self):
+        sublist1 = [[[MockTask(True, "1_0_0_0")], [MockTask(True, "1_0_0_1")]], MockTask(True, "1_0_1")]
+        sublist2 = [[[MockTask(True, "1_1_0_0")], [MockTask(True, "1_1_0_1")]], MockTask(True, "1_1_1")]
+        tree = [MockTask(True, "0"), [sublist1, sublist2]]
+        expected_log = workflow._run_tasks(deepcopy(tree), [])[1]
+        with mock.patch("wolo.workflow.ThreadPool", wraps=workflow.ThreadPool) as pool_mock:
+            executor = workflow._Executor(2)
+            try:
+                success, task_log = workflow._run_tasks(tree, [], context=workflow._RunContext(executor=executor))
+            finally:
+                executor.close()
+        self.assertEqual(pool_mock.call_count, 1)
+        self.assertEqual(success, True)
+        self.assertEqual(task_log, expected_log)
+
+    def test_executor_threads_bounded(self):
+        running = []
+        lock = threading.Lock()
+
+        def branch(duration, nested=()):
+            with lock:
+                running.append((True, threading.current_thread()))
+            time.sleep(duration)
+            executor.starmap(branch, nested)
+            with lock:
+                running.append((False, threading.current_thread()))
+            return threading.current_thread()
+
+        def max_busy_threads():
+            busy, maximum = collections.Counter(), 0
+            for thread in running:
+                busy[thread[1]] += 1 if thread[0] else -1
+                maximum = max(maximum, sum(1 for count in busy.values() if count > 0))
+            return maximum
+
+        executor = workflow._Executor(2)
+        try:
+            threads = executor.starmap(branch, [(0.05, [(0.01,), (0.01,)]), (0.05,), (0.05,), (0.05,)])
+        finally:
+            executor.close()
+        # The outermost group waits for free threads instead of running branches itself
+        self.assertNotIn(threading.current_thread(), threads)
+        self.assertEqual(max_busy_threads(), 2)
+
+    def test_run_tasks_resources(self):
+        tree = [[[ResourceTask(True, str(i), cores=2, license=i % 2)] for i in range(6)], ResourceTask(True, "6")]
+        executor = workflow._Executor(6)
+        pool = workflow._ResourcePool({"cores": 4, "license": 1})
+        try:
+            success, task_log = workflow._run_tasks(tree, [], context=workflow._RunContext(executor=executor,
+                                                                                            resources=pool))
+        finally:
+            executor.close()
+            pool.close()
+        self.assertEqual(success, True)
+        self.assertEqual(ResourceTask.max_used, {"cores": 4, "license": 1})
+        self.assertEqual(list(pool._used), [0, 0])
+        # Needs larger than the capacity are reduced to the capacity
+        self.assertEqual(pool._needs(ResourceTask(True, "big", cores=8)), [4, 0])
+
+    def test_longest_first(self):
+        def timed(time):
+            return log.TaskLog(index=[], task_class="MockTask", last_run_success=True, execution_time=time)
+        branches = [["a"], ["b", "c"], [[["d"], ["e"]]], ["f", "g", "h"]]
+        logs = [[timed(1)], [timed(2), timed(2)], [[[timed(1)], [timed(6)]]], None]
+        # The mean of all execution times (2.4) is used for the branch without a log
+        self.assertEqual(workflow._longest_first(branches, logs), [3, 2, 1, 0])
+        self.assertEqual(workflow._longest_first(branches, [None] * 4), [0, 1, 2, 3])
+
+    def test_run_tasks_longest_first(self):
+        tree = [[[MockTask(True, str(i))] for i in range(4)]]
+        old_log = [[[log.TaskLog(index=[0, "p" + str(i)], task_class=str(i), last_run_success=True,
+                                 execution_time=i)] for i in range(4)]]
+        submitted = []
+
+        def starmap(self, func, iterable):
+            iterable = list(iterable)
+            submitted.extend(args[0][0].name for args in iterable)
+            return list(itertools.starmap(func, iterable))
+
+        with mock.patch("wolo.workflow._Executor.starmap", starmap):
+            executor = workflow._Executor(2)
+            try:
+                success, task_log = workflow._run_tasks(tree, old_log, context=workflow._RunContext(executor=executor))
+            finally:
+                executor.close()
+        self.assertEqual(submitted, ["3", "2", "1", "0"])
+        self.assertEqual(success, True)
+        self.assertEqual([sub_log[0].task_class for sub_log in task_log[0]], ["0", "1", "2", "3"])
+
+    def test_batcher(self):
+        sizes = []
+
+        def apply_async(func, args, callback, error_callback):
+            sizes.append(len(args[1]))
+            callback(func(*args))
+
+        batcher = workflow._Batcher(2)
+        self.assertEqual(batcher.starmap(apply_async, str, [(i,) for i in range(100)]), [str(i) for i in range(100)])
+        # One branch per worker to measure the latency, afterwards the batches are only limited by the load balance
+        self.assertEqual(sizes[:3], [1, 1, 13])
+        sizes.clear()
+        batcher.latency = 0.01
+        batcher.starmap(apply_async, str, [(i,) for i in range(100)])
+        self.assertEqual(sizes[0], 5)
+
+    def test_run_tasks_remote(self):
+        tree = [MockTask(True, "0"), [[MockTask(True, "1_0_0")], [MockTask(False, "1_1_0"), MockTask(True, "1_1_1")]]]
+        expected_log = workflow._run_tasks(deepcopy(tree), [])[1]
+        broker = remote.Broker(address=("127.0.0.1", 0), authkey=b"test")
+        broker.start()
+        worker = workflow.multiprocessing.get_context("fork").Process(target=remote.work,
+                                                                      args=(broker.address, b"test"))
+        worker.start()
+        try:
+            executor = workflow._RemoteExecutor(broker.address, b"test")
+            try:
+                success, task_log = workflow._run_tasks(tree, [], context=workflow._RunContext(executor=executor))
+            finally:
+                executor.close()
+        finally:
+            broker.shutdown()
+            worker.join(5)
+            worker.terminate()
+        self.assertEqual(success, False)
+        self.assertEqual(task_log, expected_log)
+
+    def test_arun_tasks_limit(self):
+        tree = [[[AsyncTask(i)] for i in range(6)], AsyncTask(6)]
+        context = workflow._RunContext(semaphore=asyncio.Semaphore(2))
+        success, task_log = asyncio.run(workflow._arun_tasks(tree, [], context=context))
+        self.assertEqual(success, True)
+        self.assertEqual(AsyncTask.max_running, 2)
+        self.assertEqual([sub_log[0].last_run_success for sub_log in task_log[0]], [True] * 6)
+        self.assertEqual(task_log[1].inputs, {"input": 6})
+
+    def test_arun_tasks_linear_empty_log_fail(self):
+        tree = [MockTask(True, "0"), MockTask(False, "1"), MockTask(True, "2")]
+        success, task_log = asyncio.run(workflow._arun_tasks(tree, []))
+        self.assertEqual(success, False)
+        self.assertEqual(task_log, workflow._run_tasks(tree, [])[1])
+
+    def test_workflow_plan(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            f0, f1 = str(Path(tmp_dir) / "f0"), str(Path(tmp_dir) / "f1")
+            tree = [PlanTask(1, outputs=[f0]), [[PlanTask(2, inputs=[f0], outputs=[f1])], [PlanTask(3)]]]
+            test_workflow = PlanWorkflow("test", tmp_dir, tree)
+            self.assertEqual(set(test_workflow.plan()), {"0", "1_p0", "1_p1"})
+            self.assertEqual(test_workflow.plan()["1_p1"], ("PlanTask", ["never ran"]))
+            test_workflow.run()
+            self.assertEqual(test_workflow.plan(), {})
+            tree = [PlanTask(10, outputs=[f0]), [[PlanTask(2, inputs=[f0], outputs=[f1])], [PlanTask(3)]]]
+            test_plan = PlanWorkflow("test", tmp_dir, tree).plan()
+            self.assertEqual(test_plan, {"0": ("PlanTask", ["input changed: x"]),
+                                         "1_p0": ("PlanTask", ["input file is the output of a task that reruns"])})
+
+    def test_workflow_watch(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            source, other, f0, f1 = (str(Path(tmp_dir) / name) for name in ("source", "other", "f0", "f1"))
+            Path(source).touch()
+            Path(other).touch()
+            tree = [PlanTask(1, inputs=[source], outputs=[f0]),
+                    [[PlanTask(2, inputs=[f0], outputs=[f1])], [PlanTask(3, inputs=[other])]]]
+
+            touched = []
+
+            def touch_once(_):
+                if not touched:
+                    os.utime(source, (os.stat(source).st_mtime + 10,) * 2)
+                    touched.append(source)
+
+            with mock.patch("wolo.workflow.time.sleep", side_effect=touch_once), \
+                    mock.patch("wolo.workflow._run_node", wraps=workflow._run_node) as run_node_mock, \
+                    contextlib.redirect_stdout(io.StringIO()):
+                test_workflow = PlanWorkflow("test", tmp_dir, tree)
+                test_workflow.watch(interval=0, max_polls=2)
+            # Only the task using the touched file and the task depending on it are checked again
+            self.assertEqual([call[0][2] for call in run_node_mock.call_args_list], [[0], [1, "p0"]])
+            self.assertEqual(test_workflow.log.log[0].inputs[source], [source, os.stat(source).st_mtime])
+
+    def test_workflow_watch_lazy(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            source = str(Path(tmp_dir) / "source")
+            Path(source).touch()
+
+            def tree():
+                for i in range(2):
+                    yield functools.partial(PlanTask, i, inputs=[source])
+
+            def touch(_):
+                os.utime(source, (os.stat(source).st_mtime + 10,) * 2)
+
+            with mock.patch("wolo.workflow.time.sleep", side_effect=touch), contextlib.redirect_stdout(io.StringIO()):
+                test_workflow = PlanWorkflow("test", tmp_dir, tree())
+                test_workflow.watch(interval=0, max_polls=1)
+            self.assertEqual([task_log.inputs[source] for task_log in test_workflow.log.log],
+                             [[source, os.stat(source).st_mtime]] * 2)
+
+    def test_workflow_cache_folder(self):
+        with tempfile.TemporaryDirectory() as tmp_dir, tempfile.TemporaryDirectory() as cwd:
+            in_path, out_path = str(Path(tmp_dir) / "in"), str(Path(tmp_dir) / "out")
+            Path(in_path).write_text("in")
+            old_cwd = os.getcwd()
+            os.chdir(cwd)
+            try:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    tree = [[[functools.partial(CachedTask, in_path, out_path)], [PlanTask(1)]]]
+                    success, _ = PlanWorkflow("test", tmp_dir, tree).run(return_result=True)
+            finally:
+                os.chdir(old_cwd)
+            self.assertTrue(success)
+            # The caches are stored next to the log and not in the working directory
+            self.assertTrue((Path(tmp_dir) / ".wolo" / ".hash_cache").is_file())
+            self.assertTrue((Path(tmp_dir) / ".wolo" / ".artifacts" / "index").is_file())
+            self.assertFalse((Path(cwd) / ".wolo").exists())
+
+    def test_workflow_nested_lazy(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            f0 = str(Path(tmp_dir) / "f0")
+
+            def tree():
+                inner = PlanWorkflow("inner", tmp_dir, (PlanTask(i, inputs=[f0]) for i in (2, 3)))
+                return [PlanTask(1, outputs=[f0]), inner]
+
+            with contextlib.redirect_stdout(io.StringIO()):
+                self.assertEqual(set(PlanWorkflow("outer", tmp_dir, tree()).plan()), {"0", "1_0", "1_1"})
+                success, task_log = PlanWorkflow("outer", tmp_dir, tree()).run(return_result=True, dag=True)
+            self.assertTrue(success)
+            self.assertEqual([sub_log.inputs["x"] for sub_log in task_log[1]], [2, 3])
+
+    def test_workflow_capture(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            stdout = io.StringIO()
+            with contextlib.redirect_stdout(stdout):
+                success, task_log = PlanWorkflow("test", tmp_dir, [PlanTask(1), [[PlanTask(2)], [PlanTask(3)]]]).run(
+                    return_result=True, capture=True)
+            self.assertTrue(success)
+            self.assertIn("[0] PlanTask: success", stdout.getvalue())
+            self.assertNotIn("rerunning Task...", stdout.getvalue())
+            self.assertIn("rerunning Task...", Path(task_log[1][1][0].output).read_text())
+            self.assertEqual(Path(task_log[1][1][0].output).name, "1_p1.log")
+            self.assertNotIsInstance(sys.stdout, workflow.output._Router)
+
+    def test_workflow_capture_forks_before_writer(self):
+        def start():
+            # The worker processes must exist, before the progress writer thread is started
+            self.assertTrue(multiprocessing.active_children())
+            return output_start()
+
+        output_start = workflow.output.start
+        with tempfile.TemporaryDirectory() as tmp_dir, mock.patch("wolo.workflow.num_of_threads", 2), \
+                mock.patch("wolo.workflow.multicore_switch", True), \
+                mock.patch("wolo.workflow.output.start", side_effect=start) as start_mock:
+            with contextlib.redirect_stdout(io.StringIO()):
+                success, _ = PlanWorkflow("test", tmp_dir, [PlanTask(1), [[PlanTask(2)], [PlanTask(3)]]]).run(
+                    return_result=True, capture=True)
+        self.assertTrue(success)
+        self.assertTrue(start_mock.called)
+
+    def test_run_tasks_lazy(self):
+        created = []
+
+        def factory(success, name):
+            created.append(name)
+            return MockTask(success, name)
+
+        def branch(name):
+            yield functools.partial(factory, True, name + "_0")
+            yield functools.partial(factory, True, name + "_1")
+
+        tree = (step for step in [functools.partial(factory, True, "0"), (branch(name) for name in ["1_0", "1_1"]),
+                                  functools.partial(factory, False, "2"), functools.partial(factory, True, "3")])
+        expected_tree = [MockTask(True, "0"), [[MockTask(True, "1_0_0"), MockTask(True, "1_0_1")],
+                                                [MockTask(True, "1_1_0"), MockTask(True, "1_1_1")]], MockTask(False, "2")]
+        success, task_log = workflow._run_tasks(tree, [])
+        self.assertEqual(success, False)
+        self.assertEqual(created, ["0", "1_0_0", "1_0_1", "1_1_0", "1_1_1", "2"])
+        self.assertEqual(task_log, workflow._run_tasks(expected_tree, [])[1])
+
+    def test_run_tasks_forked_workers(self):
+        tree = [UnpicklableTask(True, "0"), [[UnpicklableTask(True, "1_0")], [UnpicklableTask(False, "1_1")]]]
+        expected_log = workflow._run_tasks(tree, [])[1]
+        executor = workflow._Executor(2, multicore=True)
+        try:
+            executor.register(tree)
+            success, task_log = workflow._run_tasks(tree, [], context=workflow._RunContext(executor=executor))
+        finally:
+            executor.close()
+        self.assertEqual(success, False)
+        self.assertEqual(task_log, expected_log)
+        self.assertEqual(workflow._fork_registry, {})
+
 class TetsLogObject(unittest.TestCase):
     @mock.patch("wolo.log.Path.cwd", return_value=Path("test"))
     def test_log_init(self, cwd_mock):
@@ -427,6 +998,57 @@ class TetsLogObject(unittest.TestCase):
         self.assertEqual(test_log._log, "test2")
         self.assertTrue(write_mock.called)
 
+    def test_log_backends_round_trip(self):
+        from example_objects import example_log
+        for backend in log.backends:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                test_log = log.Log(name="test", log_dic=tmp_dir, backend=backend)
+                test_log._set_log(deepcopy(example_log))
+                loaded_log = log.Log(name="test", log_dic=tmp_dir, backend=backend)
+                self.assertEqual(loaded_log.log, example_log)
+                self.assertEqual(loaded_log.record([1, 1, 0]), example_log[1][1][0])
+
+    def test_log_backend_writes_changed_records(self):
+        from example_objects import example_log
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            test_log = log.Log(name="test", log_dic=tmp_dir, backend="journal")
+            new_log = deepcopy(example_log)
+            test_log._set_log(new_log)
+            new_log[2].last_run_success = False
+            with mock.patch("wolo.log.JournalBackend._store") as store_mock:
+                test_log._set_log(new_log)
+            changed, removed = store_mock.call_args[0]
+            self.assertEqual(list(changed), ["2"])
+            self.assertEqual(removed, [])
+
+    def test_log_lazy_loading(self):
+        from example_objects import example_log
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            log.Log(name="test", log_dic=tmp_dir, backend="journal")._set_log(deepcopy(example_log))
+            lazy_log = log.Log(name="test", log_dic=tmp_dir, backend="journal").log
+            self.assertIsInstance(list.__getitem__(lazy_log, 0), int)
+            self.assertEqual(lazy_log[1][1][0], example_log[1][1][0])
+            self.assertIsInstance(list.__getitem__(lazy_log[1][1], 0), log.TaskLog)
+            self.assertIsInstance(list.__getitem__(lazy_log[1][1], 1), int)
+            self.assertIs(type(pickle.loads(pickle.dumps(lazy_log))), list)
+            self.assertEqual(pickle.loads(pickle.dumps(lazy_log)), example_log)
+            # The journal is only kept open, until all records were read or the log is written
+            test_log = log.Log(name="test", log_dic=tmp_dir, backend="journal")
+            self.assertEqual(test_log._load(), example_log)
+            self.assertIsNone(test_log._backend._reader)
+            lazy_log = test_log._load()
+            self.assertIsNotNone(test_log._backend._reader)
+            test_log._backend.write([])
+            self.assertIsNone(test_log._backend._reader)
+            self.assertEqual(lazy_log, example_log)
+
+    def test_tasklog_defaults_not_shared(self):
+        task_log = log.TaskLog(index=[0], task_class="test")
+        task_log.info["report"] = "test"
+        self.assertEqual(log.TaskLog(index=[1], task_class="test").info, {})
+        self.assertEqual(dict(task_log)["info"], {"report": "test"})
+        self.assertFalse(hasattr(task_log, "__dict__"))
+
     def test_tasklog_from_dict(self):
         self.assertEqual(log.TaskLog(index=[2], task_class="test"), log.TaskLog._from_dict({"index": [2], "task_class": "test"}))
 
@@ -457,10 +1079,72 @@ class TestFlatView(unittest.TestCase):
                   "1": {"task_class": "1"}}
         self.assertEqual(test_view.cols(["task_class"]).col_from_prop("inputs", "test").__repr__(), output)
 
+    def test_flat_view_where(self):
+        failed = example_flat_view.cols(["task_class"]).where("last_run_success", False)
+        self.assertEqual(failed.__repr__(), {"1_p1_0": {"task_class": "1_1_0"}})
+        self.assertEqual(len(example_flat_view.where("index", lambda index: index[0] == 1)), 4)
+        self.assertEqual(example_flat_view.col("task_class"), ["0", "1_0_0", "1_0_1", "1_1_0", "1_1_1", "2"])
+
+    def test_flat_view_getitem(self):
+        view = example_flat_view.cols(["task_class"])
+        self.assertEqual(view["1_p0_1"], {"task_class": "1_0_1"})
+        mask = [True, False, False, False, False, True]
+        self.assertEqual(view[mask].__repr__(), {"0": {"task_class": "0"}, "2": {"task_class": "2"}})
+        self.assertEqual(view[["2", "0"]].col("task_class"), ["2", "0"])
+
 
 from example_objects import ExampleTask
 from wolo.helper import TaskProperty
 test_task = ExampleTask("test_arg", kwarg="test_kwarg")
+
+
+class CutoffTask(task.Task):
+    early_cutoff = True
+
+    def input(self):
+        return parameters.Parameter("content", self.args[1])
+
+    def output(self):
+        return parameters.File("out", self.args[0])
+
+    def action(self):
+        self.outputs.out.path.write_text(self.args[1])
+
+    def success(self):
+        return True
+
+
+
+class ArtifactTask(CutoffTask):
+    early_cutoff = False
+    artifact_cache = True
+    actions = 0
+
+    def action(self):
+        ArtifactTask.actions += 1
+        super().action()
+
+
+class AsyncArtifactTask(ArtifactTask):
+    early_cutoff = True
+
+    async def action(self):
+        super().action()
+
+
+class CmdTask(task.Task):
+    def input(self):
+        return []
+
+    def output(self):
+        return []
+
+    def action(self):
+        return task.cmd(["echo", "test"])
+
+    def success(self):
+        return True
+
 class TestTaskClass(unittest.TestCase):
     def test_task_init(self):
         self.assertEqual(test_task.args, ["test_arg"])
@@ -479,6 +1163,124 @@ class TestTaskClass(unittest.TestCase):
         self.assertFalse(test_task_list._check(test_task_list.inputs, {"test_input": ["element1", "element2"]}))
         self.assertFalse(test_task_tuple._check(test_task_tuple.inputs, {"test_input": ["element1", "element2"]}))
 
+    def test_task_early_cutoff(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            out_path = Path(tmp_dir) / "out"
+            out_path.write_text("content")
+            os.utime(str(out_path), ns=(10 ** 9, 10 ** 9))
+            with mock.patch("wolo.task.get_hash_cache", return_value=cache.HashCache(Path(tmp_dir) / ".hash_cache")):
+                task_log = CutoffTask(out_path, "content")._run(log.TaskLog(index=[], task_class="CutoffTask"))
+                self.assertEqual(task_log.outputs, {"out": [str(out_path), 1.0]})
+                task_log = CutoffTask(out_path, "new content")._run(log.TaskLog(index=[], task_class="CutoffTask"))
+                self.assertNotEqual(task_log.outputs, {"out": [str(out_path), 1.0]})
+
+    def test_task_artifact_cache(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            out_path = Path(tmp_dir) / "out"
+            artifact_cache = cache.ArtifactCache(Path(tmp_dir) / ".artifacts", cache.HashCache(Path(tmp_dir) / ".hash_cache"))
+            with mock.patch("wolo.task.get_artifact_cache", return_value=artifact_cache):
+                for content in ["a", "b", "a"]:
+                    task_log = ArtifactTask(out_path, content)._run(log.TaskLog(index=[], task_class="ArtifactTask"))
+                    self.assertTrue(task_log.last_run_success)
+                    self.assertEqual(out_path.read_text(), content)
+                # The usage of an earlier rerun is not kept, if the outputs are restored
+                stale_log = log.TaskLog(index=[], task_class="ArtifactTask", phases={"action": [1.0, 1.0]},
+                                        child_cpu_time=1.0, child_max_rss=1)
+                task_log = ArtifactTask(out_path, "b")._run(stale_log)
+        self.assertEqual(ArtifactTask.actions, 2)
+        self.assertNotIn("action", task_log.phases)
+        self.assertEqual([task_log.child_cpu_time, task_log.child_max_rss], [None, None])
+
+    def test_task_artifact_cache_async(self):
+        threads = collections.defaultdict(set)
+
+        def record(name):
+            method = getattr(task.Task, name)
+
+            def wrapper(self, *args):
+                threads[name].add(threading.current_thread())
+                return method(self, *args)
+            return wrapper
+
+        async def run(content):
+            return await AsyncArtifactTask(out_path, content)._arun(log.TaskLog(index=[], task_class="AsyncArtifactTask"))
+
+        names = ["_artifact_key", "_restore_artifacts", "_output_fingerprints", "_cutoff", "_store_artifacts"]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            out_path = Path(tmp_dir) / "out"
+            out_path.write_text("a")
+            artifact_cache = cache.ArtifactCache(Path(tmp_dir) / ".artifacts", cache.HashCache(Path(tmp_dir) / ".hash_cache"))
+            with mock.patch("wolo.task.get_artifact_cache", return_value=artifact_cache), \
+                    mock.patch("wolo.task.get_hash_cache", return_value=artifact_cache._hash_cache), \
+                    mock.patch.multiple("wolo.task.Task", **{name: record(name) for name in names}):
+                for content in ["a", "b", "a"]:
+                    self.assertTrue(asyncio.run(run(content)).last_run_success)
+                    self.assertEqual(out_path.read_text(), content)
+        # The files are hashed and copied outside of the event loop
+        self.assertEqual(set(threads), set(names))
+        self.assertNotIn(threading.current_thread(), set.union(*threads.values()))
+
+    @mock.patch("wolo.cache.max_artifact_size", 2)
+    def test_artifact_cache_eviction(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            artifact_cache = cache.ArtifactCache(Path(tmp_dir) / ".artifacts", cache.HashCache(Path(tmp_dir) / ".hash_cache"))
+            for content in ["a", "b", "c"]:
+                (Path(tmp_dir) / content).write_text(content)
+                artifact_cache.store(content, {"out": Path(tmp_dir) / content})
+            out_path = Path(tmp_dir) / "out"
+            self.assertFalse(artifact_cache.restore("a", {"out": out_path}))
+            self.assertTrue(artifact_cache.restore("c", {"out": out_path}))
+            self.assertEqual(out_path.read_text(), "c")
+            reloaded_cache = cache.ArtifactCache(Path(tmp_dir) / ".artifacts", cache.HashCache(Path(tmp_dir) / ".hash_cache"))
+            self.assertEqual(set(reloaded_cache._load()), {"b", "c"})
+
+    def test_cache_shared_by_processes(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            # Two instances of the same cache act like two processes, which share the .wolo folder
+            paths = [Path(tmp_dir) / str(i) for i in range(4)]
+            for path in paths:
+                path.write_text(path.name)
+            first, second = (cache.HashCache(Path(tmp_dir) / ".hash_cache") for _ in range(2))
+            first.digest(paths[0])
+            second.digest(paths[1])
+            # Force a compaction
+            first._lines = 1000
+            first.digest(paths[2])
+            self.assertEqual(first._lines, 3)
+            self.assertEqual(len(cache.HashCache(Path(tmp_dir) / ".hash_cache")._load()), 3)
+            # The eviction counts the entries of the other process and keeps the files they reference
+            first, second = (cache.ArtifactCache(Path(tmp_dir) / ".artifacts",
+                                                 cache.HashCache(Path(tmp_dir) / ".hash_cache")) for _ in range(2))
+            with mock.patch("wolo.cache.max_artifact_size", 2):
+                first.store("0", {"out": paths[0]})
+                second.store("1", {"out": paths[1]})
+                second.store("0", {"out": paths[0]})
+                first.store("2", {"out": paths[2]})
+            self.assertEqual(set(first._entries), {"0", "2"})
+            out_path = Path(tmp_dir) / "out"
+            self.assertTrue(second.restore("0", {"out": out_path}))
+            self.assertEqual(out_path.read_text(), "0")
+            self.assertFalse(second.restore("1", {"out": out_path}))
+
+    def test_task_usage(self):
+        task_log = CmdTask()._run(log.TaskLog(index=[], task_class="CmdTask"))
+        self.assertEqual(set(task_log.phases), {"before", "setup", "check", "action", "success", "after"})
+        self.assertEqual(task_log.cpu_time, sum(cpu_time for _, cpu_time in task_log.phases.values()))
+        self.assertIsNotNone(task_log.child_cpu_time)
+        self.assertGreater(task_log.child_max_rss, 0)
+        self.assertGreater(task_log.max_rss, 0)
+        view = log.FlatView([task_log, log.TaskLog(index=[1], task_class="CmdTask")])
+        view = view.cols([]).col_from_prop("phases", "action")
+        self.assertEqual(dict(view), {"": {"phases_action": task_log.phases["action"][0]}, "1": {}})
+
+    def test_cmd_stderr_pipe(self):
+        script = "import sys; sys.stderr.write('x' * 1000000); print('ok')"
+        self.assertEqual(task.cmd([sys.executable, "-c", script], stderr=subprocess.PIPE), b"ok\n")
+        with self.assertRaises(subprocess.CalledProcessError) as error:
+            task.cmd([sys.executable, "-c", "import sys; sys.stderr.write('failed'); sys.exit(1)"],
+                     stderr=subprocess.PIPE)
+        self.assertEqual(error.exception.stderr, b"failed")
+
     # def test_task_run(self):
     #     test._tas
 
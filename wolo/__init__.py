@@ -1,4 +1,4 @@
 from .parameters import Parameter, File, Source, Self
-from .task import Task, cmd
-from .workflow import Workflow, set_Threads
+from .task import Task, cmd, acmd
+from .workflow import Workflow, set_Threads, set_Remote, set_Resources
 from .log import Log
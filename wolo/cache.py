@@ -0,0 +1,345 @@
+from multiprocessing.pool import ThreadPool
+from pathlib import Path
+from stat import S_ISREG
+import collections
+import contextlib
+import contextvars
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows
+    fcntl = None
+    import msvcrt
+
+chunk_size = 64 * 2 ** 20  # Files are hashed in chunks of this size (in bytes)
+hash_threads = 4  # Number of threads used to hash the chunks of a single large file
+max_artifact_size = 10 * 2 ** 30  # Maximal size of all files in the ArtifactCache (in bytes)
+link_artifacts = False  # If True, the ArtifactCache restores files as hardlinks instead of copies
+_read_size = 2 ** 20
+
+
+class _Journal():
+    """Base class for the small persistent caches in the .wolo folder.
+
+    The entries of the cache are stored as JSON lines ([key, entry]) in a journal file. New and changed entries are
+    appended, so that multiple threads and processes can share the same file. An entry None removes the key. The
+    journal is compacted, if it contains too many stale lines. Appending and compacting hold a lock file, and the
+    compaction reads the journal again before, so that no lines of other processes are lost. Subclasses need to
+    hold self._lock, while they access self._entries.
+    """
+    def __init__(self, path):
+        self._path = Path(path)
+        self._entries = None
+        self._lines = 0
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._entries is None:
+            self._entries = {}
+            self._lines = 0
+            if self._path.is_file():
+                with self._path.open("r") as f:
+                    for line in f:
+                        try:
+                            key, entry = json.loads(line)
+                        except ValueError:
+                            # A partially written line of a killed process
+                            continue
+                        if entry is None:
+                            self._entries.pop(key, None)
+                        else:
+                            self._entries[key] = entry
+                        self._lines += 1
+        return self._entries
+
+    def _reload(self):
+        """Read the journal again, so that the entries of other processes are included. Needs the file lock."""
+        self._entries = None
+        return self._load()
+
+    def _file_lock(self):
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        return _file_lock(self._path.with_name(self._path.name + ".lock"))
+
+    def _append(self, key, entry):
+        with self._file_lock():
+            self._write(key, entry)
+            self._compact_stale()
+
+    def _write(self, key, entry):
+        """Append a single line to the journal. Needs the file lock."""
+        with self._path.open("a") as f:
+            f.write(json.dumps([key, entry]) + "\n")
+        self._lines += 1
+
+    def _compact_stale(self):
+        """Compact the journal, if it contains too many stale lines. Needs the file lock."""
+        if self._lines > 2 * len(self._entries) + 100:
+            self._reload()
+            temp_path = self._path.with_name("{}.{}.{}".format(self._path.name, os.getpid(), threading.get_ident()))
+            with temp_path.open("w") as f:
+                for key, entry in self._entries.items():
+                    f.write(json.dumps([key, entry]) + "\n")
+            os.replace(str(temp_path), str(self._path))
+            self._lines = len(self._entries)
+
+
+@contextlib.contextmanager
+def _file_lock(path):
+    """Hold an exclusive lock on the file at path (it is created, if missing) in the with block. The lock works
+    across processes and threads, but is not reentrant."""
+    with open(str(path), "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    # LK_LOCK only retries for 10 seconds
+                    continue
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class HashCache(_Journal):
+    """Persistent cache for the content hashes of files. It is used by wolo.File(..., use_hash=True).
+
+    The cache is stored as a small journal file in the .wolo folder. Every entry is keyed on the device and inode
+    of a file and is only valid as long as the size and the mtime (in ns) of the file are unchanged. Therefore,
+    files that were not modified are never read again. New entries are appended to the journal, so that multiple
+    threads and processes can share the same cache. The journal is compacted, if it contains too many stale lines.
+
+    Implementation Notes:
+    - The cache is loaded lazily on the first lookup
+    - get_hash_cache() returns one shared instance per .wolo folder
+    """
+    def digest(self, path, stat=None):
+        """Return the content hash of the file at path. A stat_result can be passed to avoid a second stat call."""
+        path = Path(path)
+        if stat is None:
+            stat = path.stat()
+        key = "{}:{}".format(stat.st_dev, stat.st_ino)
+        signature = [stat.st_size, stat.st_mtime_ns]
+        with self._lock:
+            entry = self._load().get(key)
+        if entry and entry[:2] == signature:
+            return entry[2]
+        digest = hash_file(path, size=stat.st_size)
+        with self._lock:
+            self._entries[key] = signature + [digest]
+            self._append(key, self._entries[key])
+        return digest
+
+
+_hash_caches = {}
+_hash_caches_lock = threading.Lock()
+# Folder with the .wolo folder of the workflow, which is currently built or run (see use_log_dic)
+_current_log_dic = contextvars.ContextVar("wolo_log_dic", default=None)
+
+
+@contextlib.contextmanager
+def use_log_dic(log_dic):
+    """Make the .wolo folder in log_dic the default of get_hash_cache() and get_artifact_cache() in the with block.
+
+    This holds for the current thread or asyncio task. Workflows use it while they build their tasktree and while
+    their tasks run, so the caches live in the same .wolo folder as the log of the workflow.
+    """
+    token = _current_log_dic.set(log_dic)
+    try:
+        yield
+    finally:
+        _current_log_dic.reset(token)
+
+
+def _resolve_log_dic(log_dic):
+    if log_dic:
+        return Path(log_dic)
+    if _current_log_dic.get() is not None:
+        return Path(_current_log_dic.get())
+    return Path.cwd()
+
+
+def get_hash_cache(log_dic=None):
+    """Return the shared HashCache of the .wolo folder in log_dic (default: the folder of the log of the workflow,
+    which is currently built or run, see use_log_dic, and otherwise the current working dir)."""
+    log_dic = _resolve_log_dic(log_dic)
+    path = log_dic / ".wolo" / ".hash_cache"
+    with _hash_caches_lock:
+        if path not in _hash_caches:
+            _hash_caches[path] = HashCache(path)
+        return _hash_caches[path]
+
+
+class ArtifactCache(_Journal):
+    """Content-addressed store for the output files of tasks. It is used by Tasks with artifact_cache = True.
+
+    Every entry maps the fingerprint of the inputs of a task (see Task._artifact_key) to the content hashes of its
+    output files. The files themselves are stored only once per content in the objects folder. If a task needs to
+    rerun and its inputs match an entry (e.g. after reverting a parameter), the outputs are restored from the cache
+    instead of running the action again. The cache is stored in the .wolo folder, so all Logs in that folder share it.
+
+    Implementation Notes:
+    - Outputs are copied into the cache. They are restored as copies or as hardlinks (link_artifacts = True). Only
+      use hardlinks, if no task writes into an existing output file, as this would change the cached file as well.
+    - Restored files keep the timestamp of the cached file. Files, which already have the right content, are not
+      touched at all.
+    - Every entry stores, when it was used last. If all cached files are larger than max_artifact_size, the least
+      recently used entries and the files only they reference are removed. The eviction reads the index again under
+      its lock file, so it sees the entries of all processes sharing the .wolo folder.
+    """
+    def __init__(self, path, hash_cache):
+        self._objects = Path(path) / "objects"
+        self._hash_cache = hash_cache
+        super().__init__(Path(path) / "index")
+
+    def _object_path(self, digest):
+        return self._objects / digest[:2] / digest
+
+    def store(self, key, paths):
+        """Store the files in paths ({name: path}) as entry key. Nothing is stored, if one of them is missing."""
+        outputs = {}
+        for name, path in paths.items():
+            path = Path(path)
+            try:
+                stat = path.stat()
+            except OSError:
+                return
+            if not S_ISREG(stat.st_mode):
+                return
+            digest = self._hash_cache.digest(path, stat=stat)
+            object_path = self._object_path(digest)
+            if not object_path.is_file():
+                object_path.parent.mkdir(parents=True, exist_ok=True)
+                _replace_file(path, object_path, link=False)
+            outputs[name] = [digest, stat.st_size]
+        with self._lock, self._file_lock():
+            self._write(key, {"outputs": outputs, "used": time.time()})
+            # The eviction needs the sizes and references of the entries of all processes
+            self._reload()
+            self._evict()
+            self._compact_stale()
+
+    def restore(self, key, paths):
+        """Restore the files of entry key to paths ({name: path}). Returns False, if there is no complete entry."""
+        with self._lock:
+            entry = self._load().get(key)
+        if not entry or set(entry["outputs"]) != set(paths):
+            return False
+        if not all(self._object_path(digest).is_file() for digest, _ in entry["outputs"].values()):
+            return False
+        for name, path in paths.items():
+            digest = entry["outputs"][name][0]
+            path = Path(path)
+            try:
+                if self._hash_cache.digest(path) == digest:
+                    continue
+            except OSError:
+                pass
+            path.parent.mkdir(parents=True, exist_ok=True)
+            try:
+                _replace_file(self._object_path(digest), path, link=link_artifacts)
+            except FileNotFoundError:
+                # Evicted by another process in the meantime
+                return False
+        with self._lock:
+            entry = dict(entry, used=time.time())
+            self._entries[key] = entry
+            self._append(key, entry)
+        return True
+
+    def _evict(self):
+        sizes = {}
+        references = collections.Counter()
+        for entry in self._entries.values():
+            for digest, size in entry["outputs"].values():
+                sizes[digest] = size
+                references[digest] += 1
+        total_size = sum(sizes.values())
+        for key in sorted(self._entries, key=lambda key: self._entries[key]["used"]):
+            if total_size <= max_artifact_size:
+                break
+            for digest, size in self._entries.pop(key)["outputs"].values():
+                references[digest] -= 1
+                if references[digest] == 0:
+                    total_size -= size
+                    with contextlib.suppress(OSError):
+                        self._object_path(digest).unlink()
+            self._write(key, None)
+
+
+def _replace_file(source, destination, link=False):
+    """Copy (or hardlink) source to destination. The destination is replaced atomically."""
+    temp_path = destination.with_name(".{}.{}.{}".format(destination.name, os.getpid(), threading.get_ident()))
+    if link is True:
+        try:
+            os.link(str(source), str(temp_path))
+        except OSError:
+            # e.g. a different file system
+            link = False
+    if link is False:
+        shutil.copy2(str(source), str(temp_path))
+    os.replace(str(temp_path), str(destination))
+
+
+_artifact_caches = {}
+
+
+def get_artifact_cache(log_dic=None):
+    """Return the shared ArtifactCache of the .wolo folder in log_dic (default: see get_hash_cache)."""
+    log_dic = _resolve_log_dic(log_dic)
+    path = log_dic / ".wolo" / ".artifacts"
+    hash_cache = get_hash_cache(log_dic)
+    with _hash_caches_lock:
+        if path not in _artifact_caches:
+            _artifact_caches[path] = ArtifactCache(path, hash_cache)
+        return _artifact_caches[path]
+
+
+def hash_file(path, size=None):
+    """Return the sha256 based content hash of a file.
+
+    The file is split into chunks of chunk_size bytes, which are hashed independently. The final hash is build from
+    the chunk hashes. Files larger than one chunk are therefore hashed in parallel using hash_threads threads.
+    """
+    path = Path(path)
+    if size is None:
+        size = path.stat().st_size
+    offsets = range(0, max(size, 1), chunk_size)
+    if len(offsets) == 1 or hash_threads == 1:
+        chunk_hashes = [_hash_chunk(path, offset) for offset in offsets]
+    else:
+        with ThreadPool(min(hash_threads, len(offsets))) as p:
+            chunk_hashes = p.starmap(_hash_chunk, ((path, offset) for offset in offsets))
+    final = hashlib.sha256(str(size).encode("utf-8"))
+    for chunk_hash in chunk_hashes:
+        final.update(chunk_hash)
+    return final.hexdigest()
+
+
+def _hash_chunk(path, offset):
+    chunk_hash = hashlib.sha256()
+    remaining = chunk_size
+    with path.open("rb") as f:
+        f.seek(offset)
+        while remaining > 0:
+            data = f.read(min(_read_size, remaining))
+            if not data:
+                break
+            chunk_hash.update(data)
+            remaining -= len(data)
+    return chunk_hash.digest()
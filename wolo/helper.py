@@ -1,16 +1,30 @@
+import asyncio
+import contextvars
+import functools
+
+
 class TaskProperty():
+    """Holds the parameters of a Task by name. They can be accessed as attributes (myproperty.name)."""
+    __slots__ = ("_parameters",)
+
     def __init__(self, dic):
-        self.__dict__.update(dic)
+        self._parameters = dict(dic)
+
+    def __getattr__(self, name):
+        try:
+            return object.__getattribute__(self, "_parameters")[name]
+        except KeyError:
+            raise AttributeError(name) from None
 
     def __getitem__(self, selection):
-        return {key: self.__dict__[key] for key in selection}
+        return {key: self._parameters[key] for key in selection}
 
     def __iter__(self):
-        for value in self.__dict__.values():
+        for value in self._parameters.values():
             yield value
 
     def __eq__(self, other):
-        return (isinstance(other, self.__class__) and self.__dict__ == other.__dict__)
+        return (isinstance(other, self.__class__) and self._parameters == other._parameters)
 
 
 def pretty_print_index(index, style="brackets"):
@@ -52,3 +66,12 @@ def convert_return(value):
         return value
     else:
         return [value]
+
+
+async def to_thread(func, *args):
+    """Run func(*args) in the default executor of the running event loop and return its result.
+
+    Like asyncio.to_thread (only available since Python 3.9), the context of the caller is passed to the thread.
+    """
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(None, functools.partial(context.run, func, *args))
@@ -1,9 +1,27 @@
+from contextlib import closing
 from pathlib import Path
 import json
+import os
+import sqlite3
+import threading
 
 from .helper import pretty_print_index, convert_return
 
 
+def _dict_property(slot):
+    """Property for a dict, which is stored as None in slot until it is accessed"""
+    def get(self):
+        value = getattr(self, slot)
+        if value is None:
+            value = {}
+            setattr(self, slot, value)
+        return value
+
+    def set(self, value):
+        setattr(self, slot, value)
+    return property(get, set)
+
+
 class TaskLog():
     """Object that holds all information about a single Task-clas instance. This
     class is not ment to be used by the user, but is only used internally.
@@ -22,30 +40,56 @@ class TaskLog():
     - The class itself has a method (_from_dict) to generate a new TaskLog
       instance from a dictionary. This is used, when log information is loaded
       from json.
+    - The properties are stored in __slots__ to keep large logs small in memory.
+      Empty inputs, outputs and info dicts are stored as None and only created,
+      when they are accessed.
      """
-    def __init__(self, index, task_class, inputs={}, outputs={}, info={}, last_run_success=None, last_run=None, execution_time=None):
+    _fields = ("index", "task_class", "inputs", "outputs", "last_run_success", "info", "last_run", "execution_time",
+               "phases", "cpu_time", "child_cpu_time", "max_rss", "child_max_rss", "output")
+    __slots__ = ("index", "task_class", "_inputs", "_outputs", "last_run_success", "_info", "last_run",
+                 "execution_time", "phases", "cpu_time", "child_cpu_time", "max_rss", "child_max_rss", "output")
+
+    def __init__(self, index, task_class, inputs=None, outputs=None, info=None, last_run_success=None, last_run=None, execution_time=None,
+                 phases=None, cpu_time=None, child_cpu_time=None, max_rss=None, child_max_rss=None, output=None):
         self.index = index
         self.task_class = task_class
-        self.inputs = inputs
-        self.outputs = outputs
+        self._inputs = inputs or None
+        self._outputs = outputs or None
         self.last_run_success = last_run_success
-        self.info = info
+        self._info = info or None
         self.last_run = last_run
         self.execution_time = execution_time
+        self.phases = phases
+        self.cpu_time = cpu_time
+        self.child_cpu_time = child_cpu_time
+        self.max_rss = max_rss
+        self.child_max_rss = child_max_rss
+        self.output = output
+
+    inputs = _dict_property("_inputs")
+    outputs = _dict_property("_outputs")
+    info = _dict_property("_info")
+
+    def _value(self, attr):
+        """Return the value of a property without creating the dict of an empty property"""
+        if attr in ("inputs", "outputs", "info"):
+            return getattr(self, "_" + attr) or {}
+        return getattr(self, attr)
 
     def __getitem__(self, selection):
-        return {key: self.__dict__[key] for key in selection}
+        return {key: self._value(key) for key in selection}
 
     def __iter__(self):
-        for attr, value in self.__dict__.items():
-            yield attr, value
+        for attr in self._fields:
+            yield attr, self._value(attr)
 
     def __repr__(self):
         values = ", ".join(["{} = {}".format(key, value) for key, value in dict(self).items()])
         return "TaskLog({})".format(values)
 
     def __eq__(self, other):
-        return (isinstance(other, self.__class__) and self.__dict__ == other.__dict__)
+        return (isinstance(other, self.__class__) and
+                all(self._value(attr) == other._value(attr) for attr in self._fields))
 
     def __ne__(self, other):
         return not self.__eq__(other)
@@ -66,14 +110,27 @@ class TaskLog():
 class Log():
     """Wolo will create all the logs is a subfolder of the current working dir called .wolo.
     Be aware, that you have to call the workflow file from the same working directory every time
+
+    The log can be stored using different backends (see the backends dictionary). The backend can be selected by
+    its name or by passing a backend class:
+    - "json": The whole log is stored in one json file, which is rewritten on every save (default)
+    - "journal": Append-only journal, only changed records are appended
+    - "sqlite": sqlite3 database, only changed records are written and single records can be loaded by position
+
+    The log is loaded lazily: The TaskLog objects are only created, when they are accessed (see _LazyLog). The
+    journal backend does not even parse the records upfront, but only remembers where they are in the file.
     """
-    def __init__(self, name, log_dic=None):
+    def __init__(self, name, log_dic=None, backend="json"):
         if log_dic:
             self._log_dic = Path(log_dic)
         else:
             self._log_dic = Path.cwd()
+        if isinstance(backend, str):
+            backend = backends[backend]
         self._log_dic = self._log_dic / ".wolo"
-        self._log_path = self._log_dic / ".{}".format(name)
+        self._log_path = self._log_dic / ".{}{}".format(name, backend.suffix)
+        self._backend = backend(self._log_path)
+        self.checkpoint = Checkpoint(self._log_dic / ".{}.checkpoint".format(name))
         self._log = None
         self._flattened = None
 
@@ -95,21 +152,327 @@ class Log():
         return self._flattened
 
     def _load(self):
-        if self._log_path.is_file():
-            temp_log = json.load(self._log_path.open("r"))
-            return list(_recursive_iterate_log(temp_log, TaskLog._from_dict))
-        else:
-            return []
+        return _LazyLog(self._backend.load(), self._backend.parse)
 
     def _write(self):
         self._log_dic.mkdir(parents=True, exist_ok=True)
         save_log = _recursive_iterate_log(self.log, lambda x: dict(x))
-        json.dump(list(save_log), self._log_path.open("w"), sort_keys=True, indent=4)
+        self._backend.write(list(save_log))
+
+    def record(self, position):
+        """Return the TaskLog at position (list of list-indices into the nested log). If the log is not loaded yet,
+        only this single record is loaded, if the backend supports it."""
+        if self._log:
+            node = self._log
+            for i in position:
+                node = node[i]
+            return node
+        record = self._backend.load_record(_position_key(position))
+        if record is None:
+            return None
+        return TaskLog._from_dict(record)
 
     def simple_tree(self, formatter=lambda x: x.task_class):
         return list(_recursive_iterate_log(self.log, formatter))
 
 
+class Checkpoint():
+    """Journal of TaskLogs, which finished during the current run of a workflow.
+
+    Every TaskLog is appended as a single line as soon as the Task finished and the file is synced to disk. This
+    works from threads and worker processes alike, as the file is opened in append mode for every write. If the
+    process is killed, the next run uses these TaskLogs instead of the (outdated) ones in the log and skips all
+    tasks that already finished successfully. The checkpoint is removed, once the full log was written.
+    """
+    def __init__(self, path):
+        self._path = Path(path)
+
+    def commit(self, task_log):
+        line = (json.dumps(dict(task_log), sort_keys=True) + "\n").encode("utf-8")
+        try:
+            fd = os.open(str(self._path), os.O_WRONLY | os.O_APPEND | os.O_CREAT)
+        except FileNotFoundError:
+            self._path.parent.mkdir(parents=True, exist_ok=True)
+            fd = os.open(str(self._path), os.O_WRONLY | os.O_APPEND | os.O_CREAT)
+        try:
+            os.write(fd, line)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def load(self):
+        """Return a dict of all committed TaskLogs with the underscore index as key"""
+        task_logs = {}
+        if self._path.is_file():
+            with self._path.open("r") as f:
+                for line in f:
+                    try:
+                        task_log = TaskLog._from_dict(json.loads(line))
+                    except ValueError:
+                        # A partially written line of a killed process
+                        continue
+                    task_logs[pretty_print_index(task_log.index, style="underscore")] = task_log
+        return task_logs
+
+    def clear(self):
+        if self._path.is_file():
+            self._path.unlink()
+
+
+class JsonBackend():
+    """Stores the whole nested log in a single json file. The file is rewritten on every save, which is fine for
+    small workflows.
+
+    All backends implement load (return the nested log of raw records), parse (turn a raw record into a dict),
+    load_record and write.
+    """
+    suffix = ""
+
+    def __init__(self, path):
+        self._path = Path(path)
+
+    @staticmethod
+    def parse(record):
+        return record
+
+    def load(self):
+        if self._path.is_file():
+            with self._path.open("r") as f:
+                return json.load(f)
+        else:
+            return []
+
+    def load_record(self, pos):
+        node = self.load()
+        try:
+            for i in _position_from_key(pos):
+                node = node[i]
+        except (IndexError, TypeError):
+            return None
+        return node
+
+    def write(self, tree):
+        with self._path.open("w") as f:
+            json.dump(tree, f, sort_keys=True, indent=4)
+
+
+class _RecordBackend():
+    """Base class for backends, which store every TaskLog as a single record keyed by its position in the nested log.
+    Only records, which changed since the last load/write, are passed to _store.
+
+    Subclasses need to implement _read (return all records as {pos: json_string}), _read_one and _store.
+    The raw records are the json strings, so they are only parsed when they are accessed.
+    """
+    suffix = ""
+
+    def __init__(self, path):
+        self._path = Path(path)
+        self._written = None
+
+    def load(self):
+        # The records are read again before the next write, so that they do not need to be kept in memory
+        self._written = None
+        return _nest_records(self._read())
+
+    @staticmethod
+    def parse(record):
+        return json.loads(record)
+
+    def load_record(self, pos):
+        record = self._read_one(pos)
+        if record is None:
+            return None
+        return json.loads(record)
+
+    def write(self, tree):
+        if self._written is None:
+            self._written = self._read()
+        new_records = {pos: json.dumps(record, sort_keys=True) for pos, record in _flatten_records(tree)}
+        changed = {pos: record for pos, record in new_records.items() if self._written.get(pos) != record}
+        removed = [pos for pos in self._written if pos not in new_records]
+        if changed or removed:
+            self._store(changed, removed)
+        self._written = new_records
+
+
+class JournalBackend(_RecordBackend):
+    """Append-only journal. Every line holds the position of a record and the record as json (null for a removed
+    record). When the log is loaded, the journal is replayed. The journal is compacted, if it contains too many
+    stale lines.
+
+    Loading only builds an index with the file offset of the newest line of every record (the raw records are the
+    offsets). The records are read and parsed, when they are accessed. The file stays open for that, but only until
+    all records were read or the log is written. Before the log is written, the lines of all records that were not
+    read yet are kept in memory, as compacting replaces the file and the offsets would become invalid.
+    """
+    suffix = ".journal"
+
+    def __init__(self, path):
+        super().__init__(path)
+        self._reader = None
+        self._reader_lock = threading.Lock()
+        self._unread = set()
+        self._unread_lines = {}
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_reader"] = None
+        del state["_reader_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._reader_lock = threading.Lock()
+
+    def load(self):
+        self._written = None
+        with self._reader_lock:
+            self._close_reader()
+            self._unread_lines = {}
+            if not self._path.is_file():
+                self._unread = set()
+                return []
+            self._reader = self._path.open("rb")
+            offsets = self._offsets(self._reader)
+            self._unread = set(offsets.values())
+            if not self._unread:
+                self._close_reader()
+            return _nest_records(offsets)
+
+    def parse(self, offset):
+        with self._reader_lock:
+            line = self._unread_lines.get(offset)
+            if line is None:
+                line = self._read_line(offset)
+            self._unread.discard(offset)
+            if not self._unread:
+                self._close_reader()
+        return json.loads(line.partition(b"\t")[2].decode("utf-8"))
+
+    def write(self, tree):
+        with self._reader_lock:
+            for offset in self._unread:
+                self._unread_lines[offset] = self._read_line(offset)
+            self._unread = set()
+            self._close_reader()
+        super().write(tree)
+
+    def _read_line(self, offset):
+        if self._reader is None:
+            self._reader = self._path.open("rb")
+        self._reader.seek(offset)
+        return self._reader.readline()
+
+    def _close_reader(self):
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+
+    @staticmethod
+    def _offsets(f):
+        """Return {pos: offset of the newest line} of all records in the journal without parsing them"""
+        offsets = {}
+        offset = 0
+        for line in f:
+            pos, sep, record = line.rstrip(b"\n").partition(b"\t")
+            if sep and record:
+                if record == b"null":
+                    offsets.pop(pos.decode("utf-8"), None)
+                else:
+                    offsets[pos.decode("utf-8")] = offset
+            offset += len(line)
+        return offsets
+
+    def _lines(self):
+        if not self._path.is_file():
+            return
+        with self._path.open("r") as f:
+            for line in f:
+                pos, sep, record = line.rstrip("\n").partition("\t")
+                if not sep or not record:
+                    # A partially written line of a killed process
+                    continue
+                yield pos, record
+
+    def _read(self):
+        records = {}
+        self._num_lines = 0
+        for pos, record in self._lines():
+            self._num_lines += 1
+            if record == "null":
+                records.pop(pos, None)
+            else:
+                records[pos] = record
+        return records
+
+    def _read_one(self, pos):
+        if not self._path.is_file():
+            return None
+        with self._path.open("rb") as f:
+            offset = self._offsets(f).get(pos)
+            if offset is None:
+                return None
+            f.seek(offset)
+            return f.readline().rstrip(b"\n").partition(b"\t")[2].decode("utf-8")
+
+    def _store(self, changed, removed):
+        lines = ["{}\t{}\n".format(pos, record) for pos, record in changed.items()]
+        lines += ["{}\tnull\n".format(pos) for pos in removed]
+        num_records = len(self._written) + len(changed) - len(removed)
+        if self._num_lines + len(lines) > 2 * num_records + 100:
+            self._compact({**{pos: record for pos, record in self._written.items() if pos not in removed}, **changed})
+            return
+        with self._path.open("a") as f:
+            f.writelines(lines)
+            f.flush()
+            os.fsync(f.fileno())
+        self._num_lines += len(lines)
+
+    def _compact(self, records):
+        temp_path = self._path.with_name(self._path.name + ".tmp")
+        with temp_path.open("w") as f:
+            f.writelines("{}\t{}\n".format(pos, record) for pos, record in records.items())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(str(temp_path), str(self._path))
+        self._num_lines = len(records)
+
+
+class SqliteBackend(_RecordBackend):
+    """Stores the records in a sqlite3 database. Only changed records are written (in a single transaction) and
+    single records can be loaded by their position without reading the whole log."""
+    suffix = ".sqlite"
+
+    def _connect(self):
+        connection = sqlite3.connect(str(self._path))
+        connection.execute("CREATE TABLE IF NOT EXISTS records (pos TEXT PRIMARY KEY, record TEXT)")
+        return connection
+
+    def _read(self):
+        if not self._path.is_file():
+            return {}
+        with closing(self._connect()) as connection:
+            return dict(connection.execute("SELECT pos, record FROM records"))
+
+    def _read_one(self, pos):
+        if not self._path.is_file():
+            return None
+        with closing(self._connect()) as connection:
+            row = connection.execute("SELECT record FROM records WHERE pos = ?", (pos,)).fetchone()
+        if row is None:
+            return None
+        return row[0]
+
+    def _store(self, changed, removed):
+        with closing(self._connect()) as connection:
+            with connection:
+                connection.executemany("INSERT OR REPLACE INTO records (pos, record) VALUES (?, ?)", changed.items())
+                connection.executemany("DELETE FROM records WHERE pos = ?", ((pos,) for pos in removed))
+
+
+backends = {"json": JsonBackend, "journal": JournalBackend, "sqlite": SqliteBackend}
+
+
 class FlatView():
     """A flat Dictionary representation of a Log. Flat means that the Log is not
     nested (compare in the tree representation) The intendet usecase is to
@@ -123,24 +486,77 @@ class FlatView():
     - "index": index in tuple form. A string representation of index is already used as main object identifier
     - "execution_time": Execution time of the task's run method, measured during the last rerunning
     - "last_run": Last date the Task the task ran
+    - "phases": Dict of [wall time, CPU time] (in s) of all phases of the task during the last rerunning ("before",
+      "setup" of in- and outputs, "check" if a rerun is needed, "action", "success", "after")
+    - "cpu_time": CPU time of all phases (only the thread running the task is measured)
+    - "child_cpu_time": CPU time of all commands run with wolo.cmd by the task
+    - "max_rss": Peak memory (RSS in bytes) of the process, that ran the task, measured after the task
+    - "child_max_rss": Peak memory (RSS in bytes) of the largest command run with wolo.cmd by the task
+    - "output": Path of the file with the captured output of the last rerun (see Workflow.run(capture=True))
 
     Note: The col methods still passes all the information to the new Object. So
     the col selection can be changed from the same Object.
 
     It is also possible to create a new column from a specific input or output
     using the .col_from_prop(prop, subprop) method using "inputs" or "outputs"
-    as prop and the wanted parameter name as subprop.
+    as prop and the wanted parameter name as subprop. This works for "phases" as
+    well (e.g. .col_from_prop("phases", "action") gives the wall time of the action).
+
+    Rows can be filtered using .where(col, condition) with a value or a function as
+    condition (e.g. .where("last_run_success", False)) or using a list of booleans
+    or of indices (view[mask]). view["1_p0_0"] returns the row of a single task and
+    view.col(col) the values of a single column.
+
+    Implementation Notes:
+    - The data is stored column wise: One list per column and one list with the
+      string index of every task. cols, where and [] only create a new view with
+      another selection of columns and rows on the same lists.
+    - Columns created by col_from_prop are calculated on request and are shared
+      by all views of the same log. A task without the subprop has no value in
+      the column (it is missing in its row and None in to_pandas).
+    - .log and __repr__ return the selected data as dict of rows keyed by the
+      string index
     """
 
-    def __init__(self, log, initial=None, flatten=True):
+    def __init__(self, log, flatten=True):
         if flatten is True:
-            self.log = dict(_flatten_log(log))
-        else:
-            self.log = log
-        if not initial:
-            self._initial = self.log
+            rows = _flatten_log(log)
         else:
-            self._initial = initial
+            rows = ((key, row.items()) for key, row in log.items())
+        self._index = []
+        self._columns = {}
+        for position, (key, row) in enumerate(rows):
+            self._index.append(key)
+            for name, value in row:
+                column = self._columns.get(name)
+                if column is None:
+                    column = self._columns[name] = [_missing] * position
+                column.append(value)
+        for column in self._columns.values():
+            column.extend([_missing] * (len(self._index) - len(column)))
+        self._selected = list(self._columns)
+        self._rows = None
+        self._positions = None
+
+    def _view(self, selected=None, rows=None):
+        view = object.__new__(FlatView)
+        view._index = self._index
+        view._columns = self._columns
+        view._selected = self._selected if selected is None else selected
+        view._rows = rows
+        view._positions = self._positions
+        return view
+
+    def _row_positions(self):
+        if self._rows is None:
+            return range(len(self._index))
+        return self._rows
+
+    @property
+    def log(self):
+        columns = [(name, self._columns[name]) for name in self._selected]
+        return {self._index[i]: {name: column[i] for name, column in columns if column[i] is not _missing}
+                for i in self._row_positions()}
 
     def __repr__(self):
         return self.log
@@ -148,45 +564,176 @@ class FlatView():
     def __str__(self):
         return str(self.log)
 
+    def __len__(self):
+        return len(self._row_positions())
+
     def __iter__(self):
         for key, element in self.log.items():
             yield key, element
 
     def __getitem__(self, selection):
-        new_log = self.log[selection]
-        return FlatView(new_log, initial=self._initial, flatten=False)
+        """Return the row of a single task (string index) or a view with the rows selected by a list of booleans
+        or string indices"""
+        if self._positions is None:
+            self._positions = {key: i for i, key in enumerate(self._index)}
+        if isinstance(selection, str):
+            i = self._positions[selection]
+            return {name: self._columns[name][i] for name in self._selected if self._columns[name][i] is not _missing}
+        selection = list(selection)
+        if selection and isinstance(selection[0], bool):
+            rows = [i for i, selected in zip(self._row_positions(), selection) if selected]
+        else:
+            rows = [self._positions[key] for key in selection]
+        return self._view(rows=rows)
 
     def cols(self, selection):
         """Take list of property name and return FlatView object whith just these columns"""
         selection = convert_return(selection)
-        new_log = {key: {in_key: val[in_key] for in_key in selection} for key, val in self._initial.items()}
-        return FlatView(new_log, initial=self._initial, flatten=False)
+        for name in selection:
+            if name not in self._columns:
+                raise KeyError(name)
+        return self._view(selected=selection, rows=self._rows)
+
+    def col(self, name):
+        """Return the values of a single column for all rows of the view (None for missing values)"""
+        column = self._columns[name]
+        return [None if column[i] is _missing else column[i] for i in self._row_positions()]
 
     def col_from_prop(self, prop, subprop, include_hash=False):
-        for key, value in self._initial.items():
-            if subprop in value[prop]:
-                val = self.log[key]
-                new_value = convert_return(value[prop][subprop])
-                if include_hash is False:
-                    new_value = new_value[0]
-                val.update({"_".join([prop, subprop]): new_value})
-                self.log[key] = val
-        return FlatView(self.log, initial=self._initial, flatten=False)
+        name = "_".join([prop, subprop])
+        new_column = []
+        for value in self._columns[prop]:
+            if value is _missing or not value or subprop not in value:
+                new_column.append(_missing)
+                continue
+            new_value = convert_return(value[subprop])
+            if include_hash is False:
+                new_value = new_value[0]
+            new_column.append(new_value)
+        self._columns[name] = new_column
+        selected = self._selected if name in self._selected else self._selected + [name]
+        return self._view(selected=selected, rows=self._rows)
+
+    def where(self, col, condition):
+        """Return a view with all rows, whose value in col equals condition (or for which condition(value) is True,
+        if condition is a function)"""
+        column = self._columns[col]
+        if callable(condition):
+            rows = [i for i in self._row_positions() if column[i] is not _missing and condition(column[i])]
+        else:
+            rows = [i for i in self._row_positions() if column[i] is not _missing and column[i] == condition]
+        return self._view(rows=rows)
 
     def to_pandas(self):
         import pandas as pd
-        return pd.DataFrame.from_dict(self.log, orient="index")
+        rows = self._rows
+        data = {}
+        for name in self._selected:
+            column = self._columns[name]
+            if rows is not None:
+                column = [column[i] for i in rows]
+            if _missing in column:
+                column = [None if value is _missing else value for value in column]
+            data[name] = column
+        index = self._index if rows is None else [self._index[i] for i in rows]
+        return pd.DataFrame(data, index=index, columns=self._selected)
+
+
+_missing = object()  # Marks the tasks without a value in a column of a FlatView
 
 
 def _flatten_log(L):
-    """Flattens a nested log"""
+    """Flattens a nested log. Yields the string index and the TaskLog (which iterates over its key-value pairs)"""
     for i in L:
         if isinstance(i, TaskLog):
-            yield i._to_dict()
+            yield pretty_print_index(i.index, style="underscore"), i
         else:
             yield from _flatten_log(i)
 
 
+def _position_key(position):
+    return "/".join(str(i) for i in position)
+
+
+def _position_from_key(pos):
+    return [int(i) for i in pos.split("/")]
+
+
+def _flatten_records(L, position=()):
+    """Yields (position key, record) pairs of a nested log"""
+    for i, element in enumerate(L):
+        if isinstance(element, (list, tuple)):
+            yield from _flatten_records(element, position + (i,))
+        else:
+            yield _position_key(position + (i,)), element
+
+
+def _nest_records(records):
+    """Rebuild the nested log from a {position key: record} dictionary"""
+    tree = []
+    for position in sorted((_position_from_key(pos) for pos in records)):
+        node = tree
+        for i in position[:-1]:
+            while len(node) <= i:
+                node.append([])
+            node = node[i]
+        while len(node) <= position[-1]:
+            node.append(None)
+        node[position[-1]] = records[_position_key(position)]
+    return tree
+
+
+class _LazyLog(list):
+    """Nested log, which holds the raw records of a backend and only creates the TaskLog of a record, when it is
+    accessed (by index, slice or iteration). Sublists are _LazyLogs as well.
+
+    Comparing, copying and pickling creates all TaskLogs. Copies and pickles are normal lists.
+    """
+    def __init__(self, raw, parse):
+        super().__init__(_LazyLog(element, parse) if isinstance(element, list) else element for element in raw)
+        self._parse = parse
+
+    def _get(self, i):
+        element = list.__getitem__(self, i)
+        if element is not None and not isinstance(element, (list, TaskLog)):
+            element = TaskLog._from_dict(self._parse(element))
+            list.__setitem__(self, i, element)
+        return element
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self._get(j) for j in range(*i.indices(len(self)))]
+        return self._get(i)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self._get(i)
+
+    def __reversed__(self):
+        for i in reversed(range(len(self))):
+            yield self._get(i)
+
+    def __contains__(self, value):
+        return any(element == value for element in self)
+
+    def __eq__(self, other):
+        return list(self) == other
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return repr(list(self))
+
+    def __reduce__(self):
+        return list, (list(self),)
+
+    def copy(self):
+        return list(self)
+
+
 def _recursive_iterate_log(L, func):
     for i in L:
         if isinstance(i, (list, tuple)):
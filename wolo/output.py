@@ -0,0 +1,141 @@
+"""Capturing of the output of tasks for Workflow.run(capture=True).
+
+While capturing, sys.stdout and sys.stderr are replaced by _Router objects. Everything a task prints (including
+tracebacks) is written to the output file of that task, everything else goes to the original streams. The target
+is stored in a context variable, so this works for tasks running in parallel threads and for concurrent asyncio
+tasks. Output of threads started by a task itself is not captured.
+
+Instead of the status lines of every task, a single background thread writes one progress line per finished task.
+
+Implementation Notes:
+- start() and stop() can be nested (e.g. for nested workflows). Only the outermost call installs the routers
+- Worker processes inherit the routers, if they are forked. In other worker processes, capture() installs them.
+  Progress lines of worker processes are written directly, as they do not have the writer thread.
+"""
+import contextlib
+import contextvars
+import os
+import queue
+import sys
+import threading
+
+_target = contextvars.ContextVar("wolo_output_target", default=None)
+_lock = threading.Lock()
+_num_started = 0
+_writer = None
+
+
+class _Router():
+    """Stand-in for sys.stdout/sys.stderr, which writes to the output file of the current task (if any)"""
+    def __init__(self, stream):
+        self._stream = stream
+
+    def _current(self):
+        target = _target.get()
+        if target is None:
+            return self._stream
+        return target
+
+    def write(self, text):
+        return self._current().write(text)
+
+    def flush(self):
+        return self._current().flush()
+
+    def fileno(self):
+        return self._current().fileno()
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+class _ProgressWriter():
+    def __init__(self):
+        self.pid = os.getpid()
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._write, daemon=True)
+        self._thread.start()
+
+    def _write(self):
+        while True:
+            line = self._queue.get()
+            if line is None:
+                return
+            _write_line(line)
+
+    def put(self, line):
+        self._queue.put(line)
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+
+def _install():
+    if not isinstance(sys.stdout, _Router):
+        sys.stdout = _Router(sys.stdout)
+    if not isinstance(sys.stderr, _Router):
+        sys.stderr = _Router(sys.stderr)
+
+
+def _uninstall():
+    if isinstance(sys.stdout, _Router):
+        sys.stdout = sys.stdout._stream
+    if isinstance(sys.stderr, _Router):
+        sys.stderr = sys.stderr._stream
+
+
+def _write_line(line):
+    stream = sys.stdout
+    if isinstance(stream, _Router):
+        stream = stream._stream
+    stream.write(line + "\n")
+    stream.flush()
+
+
+def start():
+    """Install the routers and start the progress writer"""
+    global _num_started, _writer
+    with _lock:
+        if _num_started == 0:
+            _install()
+            _writer = _ProgressWriter()
+        _num_started += 1
+
+
+def stop():
+    """Stop the progress writer (after all lines are written) and restore sys.stdout and sys.stderr"""
+    global _num_started, _writer
+    with _lock:
+        _num_started -= 1
+        if _num_started == 0:
+            _writer.close()
+            _writer = None
+            _uninstall()
+
+
+def progress(line):
+    """Write a single progress line (from any thread or process)"""
+    writer = _writer
+    if writer is not None and writer.pid == os.getpid():
+        writer.put(line)
+    else:
+        _write_line(line)
+
+
+@contextlib.contextmanager
+def capture(path):
+    """Write everything, that is printed in the with block by the current thread (or asyncio task), to path"""
+    _install()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("w", buffering=1) as f:
+        token = _target.set(f)
+        try:
+            yield path
+        finally:
+            _target.reset(token)
+
+
+def current():
+    """Return the output file of the current task or None, if its output is not captured"""
+    return _target.get()
@@ -1,6 +1,15 @@
+from multiprocessing.pool import ThreadPool
 from pathlib import Path
+from stat import S_ISREG
+import contextlib
+import contextvars
 import inspect
 import hashlib
+import os
+import threading
+import traceback
+
+from .cache import get_hash_cache
 
 
 class Parameter():
@@ -10,7 +19,10 @@ class Parameter():
     _log_value: The value which is used to check if a Parameter changed. By default it is the value.
 
     Notes: You can easily extend the Parameter class by manipulating the _log_value. See the Files class for example.
+    The built-in Parameters use __slots__ to save memory. Subclasses without __slots__ work as usual.
     """
+    __slots__ = ("name", "value", "_log_value")
+
     def __init__(self, name, value, _log_value=None):
         self.name = name
         self.value = value
@@ -36,45 +48,199 @@ class File(Parameter):
     name: name for the file/parameter
     path: path to the file
     autocreate: if True it is checked, if the file exists. If not, it will be created. Interesting for output files.
+    use_hash: if True the content hash of the file is used instead of the timestamp. A touch, a checkout or a copy
+              of identical data will then not trigger a rerun. The hashes are stored in a persistent cache in the
+              .wolo folder (see wolo.cache.HashCache), so that unchanged files are not read again.
 
-    Notes: The .changed() Method can be used to check if a the timestamp of a file is changed. This can be interesting in the success method.
+    Notes: The .changed() Method can be used to check if a the timestamp (or the content) of a file is changed. This can be interesting in the success method.
+    Files created inside a prefetch() block (e.g. while a Workflow builds its tasktree) are checked in bulk at the
+    end of the block.
     """
-    def __init__(self, name, path, autocreate=False):
+    __slots__ = ("path", "parent", "use_hash", "_mod_date")
+
+    def __init__(self, name, path, autocreate=False, use_hash=False):
         self.path = Path(path)
         self.parent = self.path.parent
         self.name = name
-        if autocreate is True and not self.path.is_file():
-            self._create()
-        self._mod_date = self._get_mod_date()
+        self.use_hash = use_hash
+        pending = getattr(_prefetch, "files", None)
+        if pending is not None:
+            pending.append((self, autocreate))
+            self._mod_date = _pending_state
+        else:
+            stat = _stat(self.path)
+            if autocreate is True and stat is None:
+                self._create()
+                stat = _stat(self.path)
+            self._mod_date = self._state_from_stat(stat)
         super().__init__(name=self.name, value=str(self.path), _log_value=[str(self.path), self._mod_date])
 
     def _get_mod_date(self):
-        if self.path.is_file():
-            mod_date = self.path.stat().st_mtime
-        else:
-            mod_date = None
-        return mod_date
+        return self._state_from_stat(_stat(self.path), use_hash=False)
+
+    def _get_hash(self):
+        return self._state_from_stat(_stat(self.path), use_hash=True)
+
+    def _state_from_stat(self, stat, use_hash=None):
+        """Return the timestamp (or the content hash) of the file based on its stat result (None, if it is missing)"""
+        if use_hash is None:
+            use_hash = self.use_hash
+        if stat is None:
+            return None
+        if use_hash is True:
+            return get_hash_cache().digest(self.path, stat=stat)
+        return stat.st_mtime
+
+    def _get_state(self):
+        return self._state_from_stat(_stat(self.path))
+
+    def _set_state(self, state):
+        self._mod_date = state
+        self._log_value = [str(self.path), state]
 
     def changed(self):
-        """Check if the timestamp is updated in between runs"""
-        return not self._mod_date == self._get_mod_date()
+        """Check if the timestamp (or the content hash) is updated in between runs"""
+        if self._mod_date is _pending_state:
+            self._set_state(self._get_state())
+        return not self._mod_date == self._get_state()
 
     def _create(self):
         self.parent.mkdir(parents=True, exist_ok=True)
         self.path.open('a').close()
 
     def _update(self):
-        self._mod_date = self._get_mod_date()
+        self._mod_date = self._get_state()
         super().__init__(name=self.name, value=self.path, _log_value=[str(self.path), self._mod_date])
 
 
+def _stat(path):
+    """Return the stat result of path or None, if it is not a (readable) regular file. Needs a single syscall."""
+    try:
+        stat = path.stat()
+    except (OSError, ValueError):
+        return None
+    if not S_ISREG(stat.st_mode):
+        return None
+    return stat
+
+
+_prefetch = threading.local()
+# Placeholder for the state of a File, which is not checked yet
+_pending_state = "<pending>"
+prefetch_threads = 16
+# Number of files, which are checked by a thread at once
+prefetch_chunk_size = 256
+# Folders with fewer wanted files are not listed on Windows, their files are checked with os.stat
+scandir_min_files = 4
+
+
+@contextlib.contextmanager
+def prefetch(threads=None):
+    """Check all File parameters, which are created by the current thread in the with block, in bulk at its end.
+
+    The files are checked with a single stat call each, in chunks on threads parallel, which helps a lot on network
+    filesystems. On Windows, folders with several files are listed with os.scandir instead, as the listing already
+    carries the stat results. Nested blocks are checked at the end of the outermost one.
+    File.changed() checks a single file at once, if it is called inside the block.
+
+    threads: Number of threads (default: prefetch_threads)
+    """
+    if getattr(_prefetch, "files", None) is not None:
+        yield
+        return
+    _prefetch.files = files = []
+    try:
+        yield
+    finally:
+        _prefetch.files = None
+    # Not reached, if the block raised
+    _fingerprint(files, threads or prefetch_threads)
+
+
+def _fingerprint(files, threads):
+    """Set the state of all files (a list of (File, autocreate) tuples) in chunks (or folders on Windows)."""
+    if os.name == "nt":
+        folders = {}
+        for file, autocreate in files:
+            folders.setdefault(str(file.parent), []).append((file, autocreate))
+        func, jobs = _fingerprint_folder, list(folders.items())
+    else:
+        func = _fingerprint_files
+        jobs = [(files[i:i + prefetch_chunk_size],) for i in range(0, len(files), prefetch_chunk_size)]
+    if len(jobs) <= 1 or threads <= 1:
+        for job in jobs:
+            func(*job)
+        return
+    with ThreadPool(min(threads, len(jobs))) as p:
+        # The threads need the context of the caller (see wolo.cache.use_log_dic)
+        p.starmap(_run_in_context, ((contextvars.copy_context(), func) + tuple(job) for job in jobs))
+
+
+def _run_in_context(context, func, *args):
+    return context.run(func, *args)
+
+
+def _fingerprint_files(files, stats=None):
+    """Set the state of all files. stats holds the stat results of files, that are already known, by their name.
+
+    An error (e.g. of the autocreation) is printed, as Task.__init__ does for the files it checks directly, and the
+    state of the file is set to None. So the Workflow is still built and only the affected Task fails.
+    """
+    stats = stats or {}
+    for file, autocreate in files:
+        try:
+            if file.path.name in stats:
+                stat = stats[file.path.name]
+            else:
+                stat = _stat(file.path)
+            if autocreate is True and stat is None:
+                file._create()
+                stat = _stat(file.path)
+            state = file._state_from_stat(stat)
+        except Exception:
+            traceback.print_exc()
+            state = None
+        file._set_state(state)
+
+
+def _fingerprint_folder(folder, files):
+    # The listing reports st_ino and st_dev as 0, which the HashCache needs as key. So files with use_hash are
+    # checked with os.stat.
+    names = {file.path.name for file, _ in files if file.use_hash is not True}
+    stats = _stat_directory(folder, names) if len(names) >= scandir_min_files else {}
+    _fingerprint_files(files, stats)
+
+
+def _stat_directory(folder, names):
+    """Return the stat results (None for everything but regular files) of all entries of folder listed in names.
+    Only used on Windows, where the stat results come with the listing. Files, which are not listed (e.g. missing
+    or with a differently cased name), are not in the result."""
+    stats = {}
+    try:
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                if entry.name in names:
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    stats[entry.name] = stat if S_ISREG(stat.st_mode) else None
+    except OSError:
+        pass
+    return stats
+
+
 class Source(Parameter):
     """Special Parameter Class for sourcecode. It uses a hashvalue of the source to check if it changed.
     object: Python object you want to have the source from. inspect.getsource() is used for that.
     name: Name of the parameter. If none it is the string repr of the object.
 
     Notes: The .changed() Method can be used to check if a the source is changed compared to the last run.
+    The hashes are cached for the whole process (see _source_hash), so that creating many instances of the same
+    Task only reads and hashes its source once.
     """
+    __slots__ = ("object", "_hash")
+
     def __init__(self, name, object):
         self.object = object
         self._hash = self._get_source()
@@ -82,8 +248,7 @@ class Source(Parameter):
         super().__init__(name=self.name, value=self.object, _log_value=[self.object.__name__, self._hash])
 
     def _get_source(self):
-        source = inspect.getsource(self.object)
-        return hashlib.md5(source.encode('utf-8')).hexdigest()
+        return _source_hash(self.object)
 
     def changed(self):
         """Check if the source is updated in between runs"""
@@ -98,5 +263,41 @@ class Self(Source):
     Note: Usage as input parameter:
     Self = wolo.Self(self)
     """
+    __slots__ = ()
+
     def __init__(self, Self, name="Self"):
         super().__init__(object=Self.__class__, name=name)
+
+
+_source_cache = {}
+_source_cache_lock = threading.Lock()
+
+
+def _source_hash(object):
+    """Return the md5 hash of the source of object.
+
+    The hashes are cached per code object (functions) or per object (e.g. classes). A cached hash is only used as
+    long as the file containing the source has the same mtime and size as when the hash was calculated.
+    """
+    key = getattr(object, "__code__", object)
+    file_state = _source_file_state(object)
+    with _source_cache_lock:
+        cached = _source_cache.get(key)
+    if cached is not None and file_state is not None and cached[0] == file_state:
+        return cached[1]
+    source = inspect.getsource(object)
+    source_hash = hashlib.md5(source.encode('utf-8')).hexdigest()
+    if file_state is not None:
+        with _source_cache_lock:
+            _source_cache[key] = (file_state, source_hash)
+    return source_hash
+
+
+def _source_file_state(object):
+    """Return (path, mtime_ns, size) of the file that contains the source of object or None if there is none"""
+    try:
+        path = inspect.getsourcefile(object)
+        stat = os.stat(path)
+    except (TypeError, OSError):
+        return None
+    return path, stat.st_mtime_ns, stat.st_size
@@ -0,0 +1,121 @@
+"""Broker and workers to run the parallel groups of a workflow on other machines.
+
+Start a broker on one machine and as many workers as you like on all others:
+    python -m wolo.remote broker HOST:PORT AUTHKEY
+    python -m wolo.remote worker HOST:PORT AUTHKEY [NUMBER_OF_PROCESSES]
+Afterwards, call wolo.set_Remote((HOST, PORT), AUTHKEY) before running the workflow. All branches of the parallel
+groups in the tasktree are then sent to the broker and are run by the next free worker. Their logs are sent back
+and end up in the same log tree as for a local run.
+
+Implementation Notes:
+- Tasks are pickled, so the task classes need to be importable on all workers
+- The workers change to the working directory of the workflow before a branch is run and nested workflows write
+  their own log files. Therefore, all machines need to see the same file system (e.g. a network share)
+- Jobs and results are pickled before they are put into the queues of the broker. Errors while unpickling a job or
+  pickling a result are therefore sent back as errors of the single job.
+- Jobs of a worker that dies are lost
+"""
+from multiprocessing.managers import BaseManager
+import multiprocessing
+import os
+import pickle
+import queue
+import sys
+import threading
+import traceback
+
+_jobs = queue.Queue()
+_results = {}
+_results_lock = threading.Lock()
+
+
+def _get_jobs():
+    return _jobs
+
+
+def _get_results(client_id):
+    with _results_lock:
+        return _results.setdefault(client_id, queue.Queue())
+
+
+def _drop_results(client_id):
+    with _results_lock:
+        _results.pop(client_id, None)
+
+
+class Broker(BaseManager):
+    """multiprocessing manager, which holds a single job queue shared by all workers and one result queue per
+    client (a Workflow.run()). Use Broker(address, authkey).connect() to connect to a running broker."""
+    pass
+
+
+Broker.register("get_jobs", callable=_get_jobs)
+Broker.register("get_results", callable=_get_results)
+Broker.register("drop_results", callable=_drop_results)
+
+
+def serve(address, authkey):
+    """Run a broker at address (host, port) in this process until it is killed."""
+    Broker(address=address, authkey=authkey).get_server().serve_forever()
+
+
+def work(address, authkey, processes=1):
+    """Run processes workers, which take jobs from the broker at address until the broker is shut down."""
+    if processes == 1:
+        _work(address, authkey)
+        return
+    workers = [multiprocessing.Process(target=_work, args=(address, authkey)) for _ in range(processes)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+
+def _work(address, authkey):
+    broker = Broker(address=address, authkey=authkey)
+    broker.connect()
+    jobs = broker.get_jobs()
+    result_queues = {}
+    while True:
+        try:
+            client_id, job_id, cwd, payload = jobs.get()
+        except (EOFError, OSError):
+            # The broker is gone
+            return
+        if client_id not in result_queues:
+            result_queues[client_id] = broker.get_results(client_id)
+        no_error, result = _run_job(cwd, payload)
+        try:
+            result_queues[client_id].put((job_id, no_error, result))
+        except (EOFError, OSError):
+            return
+
+
+def _run_job(cwd, payload):
+    """Unpickle and run a single job and return its pickled result (or error)."""
+    try:
+        if os.path.isdir(cwd):
+            os.chdir(cwd)
+        func, args = pickle.loads(payload)
+        return True, pickle.dumps(func(*args))
+    except Exception as error:
+        traceback.print_exc()
+        try:
+            return False, pickle.dumps(error)
+        except Exception:
+            return False, pickle.dumps(RuntimeError(traceback.format_exc()))
+
+
+def _parse_address(address):
+    host, port = address.rsplit(":", 1)
+    return host, int(port)
+
+
+if __name__ == "__main__":
+    role, address, authkey = sys.argv[1:4]
+    if role == "broker":
+        serve(_parse_address(address), authkey.encode("utf-8"))
+    elif role == "worker":
+        work(_parse_address(address), authkey.encode("utf-8"), *[int(arg) for arg in sys.argv[4:5]])
+    else:
+        sys.exit("usage: python -m wolo.remote broker|worker HOST:PORT AUTHKEY [NUMBER_OF_PROCESSES]")
@@ -1,9 +1,25 @@
+import asyncio
+import contextlib
+import hashlib
+import inspect
+import json
+import os
 import subprocess
+import sys
+import threading
 import timeit
 import time
 import traceback
+try:
+    import resource
+except ImportError:
+    # Not available on Windows
+    resource = None
 
-from .helper import TaskProperty, convert_return
+from . import output
+from .cache import get_artifact_cache, get_hash_cache
+from .helper import TaskProperty, convert_return, to_thread
+from .parameters import File
 
 
 class Task():
@@ -21,6 +37,20 @@ class Task():
 
     Further notes:
         All arguments passed to a custom Task are stored in self.args and self.kwargs
+        before, action, success and after can also be defined as "async def". Such tasks are awaited directly,
+        if the workflow is run with Workflow.arun(). Use wolo.acmd to run commands without blocking. If before is
+        async, the inputs and outputs are processed, when the task is run and not on initialization.
+        If early_cutoff is set to True (for a single Task class or for wolo.Task), the content of all output files
+        (wolo.File) is compared before and after a rerun. Files with identical content get back their old
+        timestamp, so that the tasks depending on them are not rerun. This is not needed for File(use_hash=True).
+        If artifact_cache is set to True, the output files of every successful run are stored in a content-addressed
+        cache in the .wolo folder (see wolo.cache.ArtifactCache). If the task needs to rerun with inputs, that were
+        already seen before (e.g. after reverting a parameter), the outputs are restored instead of running action.
+        resources declares, what the task needs of the capacities set with wolo.set_Resources (e.g. cores, memory
+        in bytes or custom tokens like licenses). By default, a task needs one core. Only resources with a capacity
+        are taken into account. Example: resources = {"cores": 4, "memory": 8 * 2**30, "matlab_license": 1}
+        The wall and CPU time of every phase of a task (before, setup of in- and outputs, check, action, success,
+        after) and its memory usage are stored in the log, whenever the task reruns (see wolo.log.FlatView).
 
     Example Task class:
     import wolo
@@ -49,14 +79,44 @@ class Task():
             report = wolo.Parameter("report", self.report)
             return report  # This will be stored in self.info and stored in the Log file
     """
+    early_cutoff = False
+    artifact_cache = False
+    resources = {"cores": 1}
 
     def __init__(self, *args, **kwargs):
         self.args = convert_return(args)
         self.kwargs = kwargs
+        self.inputs = None
+        self.outputs = None
+        self._pending_before = None
+        self._phases = {}
         try:
-            self.before()
-            self.inputs = self._process(convert_return(self.input()))
-            self.outputs = self._process(convert_return(self.output()))
+            with _measure(self._phases, "before"):
+                before = self.before()
+            if inspect.isawaitable(before):
+                self._pending_before = before
+            else:
+                with _measure(self._phases, "setup"):
+                    self.inputs = self._process(convert_return(self.input()))
+                    self.outputs = self._process(convert_return(self.output()))
+        except:
+            traceback.print_exc()
+            self.inputs = None
+            self.outputs = None
+        self.i = self.inputs
+        self.o = self.outputs
+
+    async def _asetup(self):
+        """Await an async before method and process the inputs and outputs afterwards."""
+        if self._pending_before is None:
+            return
+        before, self._pending_before = self._pending_before, None
+        try:
+            with _measure(self._phases, "before"):
+                await before
+            with _measure(self._phases, "setup"):
+                self.inputs = self._process(convert_return(self.input()))
+                self.outputs = self._process(convert_return(self.output()))
         except:
             traceback.print_exc()
             self.inputs = None
@@ -64,6 +124,10 @@ class Task():
         self.i = self.inputs
         self.o = self.outputs
 
+    def _is_async(self):
+        methods = (getattr(self, name, None) for name in ("action", "success", "after"))
+        return self._pending_before is not None or any(inspect.iscoroutinefunction(method) for method in methods)
+
     def before(self):
         """Empty method, that can be overwritten by user. Is called on initialization of a task."""
         pass
@@ -79,18 +143,33 @@ class Task():
         return TaskProperty({para.name: para for para in para_list})
 
     def _check(self, para_dic, old_values):
-        changed = False
         if not para_dic:
             # Add a log warning here about missing in or outputs
             return True
+        return len(self._changed(para_dic, old_values)) > 0
+
+    def _changed(self, para_dic, old_values):
+        """Return the names of all parameters, which are new or changed compared to old_values"""
+        changed = []
         for para in para_dic:
-            if para.name in old_values:
-                if para._log_value != old_values[para.name]:
-                    changed = True
-            else:
-                changed = True
+            if para.name not in old_values or para._log_value != old_values[para.name]:
+                changed.append(para.name)
         return changed
 
+    def _rerun_reasons(self, log):
+        """Return a list of reasons, why the task would be rerun based on log. The list is empty, if the task is up to date."""
+        if log.last_run_success is None:
+            return ["never ran"]
+        reasons = []
+        for kind, para_dic, old_values in (("input", self.inputs, log.inputs), ("output", self.outputs, log.outputs)):
+            if not para_dic:
+                reasons.append("no {}s".format(kind))
+            else:
+                reasons += ["{} changed: {}".format(kind, name) for name in self._changed(para_dic, old_values)]
+        if log.last_run_success is False:
+            reasons.append("last run failed")
+        return reasons
+
     def _rebuild(self, para_dic):
         if not para_dic:
             # Add a log warning here about missing in or outputs
@@ -99,22 +178,47 @@ class Task():
             para._update()
         return {para.name: para._log_value for para in para_dic}
 
-    def _run(self, log):
-        """Check dependencies and outputs --> run task --> check success."""
+    def _needs_rerun(self, log):
         inputs_changed = self._check(self.inputs, log.inputs)
         outputs_changed = self._check(self.outputs, log.outputs)
         print("inputs changed: {}".format(inputs_changed))
         print("outputs changed: {}".format(outputs_changed))
-        if inputs_changed is True or outputs_changed is True or log.last_run_success is not True:
+        return inputs_changed is True or outputs_changed is True or log.last_run_success is not True
+
+    def _run(self, log):
+        """Check dependencies and outputs --> run task --> check success."""
+        if self._pending_before is not None:
+            asyncio.run(self._asetup())
+        with _measure(self._phases, "check"):
+            needs_rerun = self._needs_rerun(log)
+        if needs_rerun:
             log = self._rerun(log)
         return log
 
+    async def _arun(self, log):
+        """Asynchronous version of _run. Async methods of the task are awaited."""
+        await self._asetup()
+        with _measure(self._phases, "check"):
+            needs_rerun = self._needs_rerun(log)
+        if needs_rerun:
+            log = await self._arerun(log)
+        return log
+
     def _rerun(self, log):
         print("rerunning Task...")
+        artifact_key = self._artifact_key()
+        if self._restore_artifacts(artifact_key):
+            log.last_run = time.ctime(int(time.time()))
+            self._update_usage(log, None, restored=True)
+            return self._update_log(log, True, None)
+        fingerprints = self._output_fingerprints()
         start_time = timeit.default_timer()
+        _child_usage.current = child_usage = [0.0, None]
         try:
-            self.report = self.action()
-            success = all(convert_return(self.success()))
+            with _measure(self._phases, "action"):
+                self.report = self.action()
+            with _measure(self._phases, "success"):
+                success = all(convert_return(self.success()))
         except:
             traceback.print_exc()
             self.report = None
@@ -123,10 +227,131 @@ class Task():
         log.execution_time = timeit.default_timer() - start_time
         log.last_run = time.ctime(int(time.time()))
         try:
-            after = self.after()
+            with _measure(self._phases, "after"):
+                after = self.after()
         except:
             traceback.print_exc()
             after = None
+        finally:
+            _child_usage.current = None
+        if success is True:
+            self._cutoff(fingerprints)
+            self._store_artifacts(artifact_key)
+        self._update_usage(log, child_usage)
+        return self._update_log(log, success, after)
+
+    async def _arerun(self, log):
+        print("rerunning Task...")
+        # Hashing and copying the files would block the event loop, so it runs in a thread
+        artifact_key = await to_thread(self._artifact_key) if self.artifact_cache is True else None
+        if artifact_key is not None and await to_thread(self._restore_artifacts, artifact_key):
+            log.last_run = time.ctime(int(time.time()))
+            self._update_usage(log, None, restored=True)
+            return self._update_log(log, True, None)
+        fingerprints = await to_thread(self._output_fingerprints) if self.early_cutoff is True else {}
+        start_time = timeit.default_timer()
+        try:
+            with _measure(self._phases, "action"):
+                self.report = await _maybe_await(self.action())
+            with _measure(self._phases, "success"):
+                success = all(convert_return(await _maybe_await(self.success())))
+        except:
+            traceback.print_exc()
+            self.report = None
+            success = False
+        self.r = self.report
+        log.execution_time = timeit.default_timer() - start_time
+        log.last_run = time.ctime(int(time.time()))
+        try:
+            with _measure(self._phases, "after"):
+                after = await _maybe_await(self.after())
+        except:
+            traceback.print_exc()
+            after = None
+        if success is True:
+            if fingerprints:
+                await to_thread(self._cutoff, fingerprints)
+            if artifact_key is not None:
+                await to_thread(self._store_artifacts, artifact_key)
+        self._update_usage(log, None)
+        return self._update_log(log, success, after)
+
+    def _output_fingerprints(self):
+        """Return the stat result and content hash of all timestamp based output files, if early_cutoff is True."""
+        fingerprints = {}
+        if self.early_cutoff is not True or not self.outputs:
+            return fingerprints
+        for para in self.outputs:
+            if isinstance(para, File) and para.use_hash is not True:
+                try:
+                    stat = para.path.stat()
+                except OSError:
+                    continue
+                fingerprints[para.name] = (stat, get_hash_cache().digest(para.path, stat=stat))
+        return fingerprints
+
+    def _cutoff(self, fingerprints):
+        """Restore the old timestamp of all output files, whose content did not change during the rerun."""
+        unchanged = []
+        for name, (old_stat, old_hash) in fingerprints.items():
+            path = getattr(self.outputs, name).path
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            if stat.st_mtime_ns != old_stat.st_mtime_ns and get_hash_cache().digest(path, stat=stat) == old_hash:
+                os.utime(str(path), ns=(stat.st_atime_ns, old_stat.st_mtime_ns))
+                unchanged.append(name)
+        if unchanged:
+            print("early cutoff, unchanged outputs: {}".format(unchanged))
+
+    def _artifact_key(self):
+        """Return the fingerprint of the task class and its inputs, if artifact_cache is True and it has output files.
+
+        Input files are represented by their content hash instead of their timestamp.
+        """
+        if self.artifact_cache is not True or not self.outputs:
+            return None
+        if not any(isinstance(para, File) for para in self.outputs):
+            return None
+        fingerprint = [type(self).__module__, type(self).__qualname__]
+        for para in self.inputs or []:
+            if isinstance(para, File):
+                fingerprint.append([para.name, str(para.path), para._get_hash()])
+            else:
+                fingerprint.append([para.name, para._log_value])
+        return hashlib.sha256(json.dumps(fingerprint, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    def _artifact_paths(self):
+        return {para.name: para.path for para in self.outputs if isinstance(para, File)}
+
+    def _restore_artifacts(self, key):
+        if key is None or not get_artifact_cache().restore(key, self._artifact_paths()):
+            return False
+        print("restored outputs from the artifact cache")
+        return True
+
+    def _store_artifacts(self, key):
+        if key is not None:
+            get_artifact_cache().store(key, self._artifact_paths())
+
+    def _update_usage(self, log, child_usage, restored=False):
+        """Store the timings of all phases and the resource usage of the last rerun in log.
+
+        child_usage is [cpu time, peak rss] of all commands run with wolo.cmd (None for async tasks, as their
+        commands run concurrently with other tasks, and for restored tasks). Then the child usage is set to None.
+        restored: The outputs were restored from the artifact cache, so action, success and after did not run
+        """
+        if restored:
+            for name in ("action", "success", "after"):
+                self._phases.pop(name, None)
+        log.phases = dict(self._phases)
+        log.cpu_time = sum(cpu_time for _, cpu_time in log.phases.values())
+        log.child_cpu_time, log.child_max_rss = child_usage if child_usage is not None else (None, None)
+        if resource is not None:
+            log.max_rss = _rss_bytes(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+
+    def _update_log(self, log, success, after):
         if after:
             log.info = self._rebuild(self._process(convert_return(after)))
         if success is True:
@@ -140,5 +365,98 @@ class Task():
         return log
 
 
+@contextlib.contextmanager
+def _measure(phases, name):
+    """Store the wall and the CPU time (of the current thread) of the with block as phases[name]."""
+    start_time = timeit.default_timer()
+    start_cpu_time = time.thread_time()
+    try:
+        yield
+    finally:
+        phases[name] = [timeit.default_timer() - start_time, time.thread_time() - start_cpu_time]
+
+
+# [cpu time, peak rss] of the commands run by the task, which is currently rerun in this thread
+_child_usage = threading.local()
+
+
+def _rss_bytes(max_rss):
+    """ru_maxrss is given in kilobytes except for macOS"""
+    if sys.platform == "darwin":
+        return max_rss
+    return max_rss * 1024
+
+
+async def _maybe_await(value):
+    if inspect.isawaitable(value):
+        return await value
+    return value
+
+
 def cmd(*args, **kwargs):  # need to figure out where to put this
-    return subprocess.check_output(*args, **kwargs)
+    """Run a command and return its output. Accepts the same arguments as subprocess.check_output.
+
+    The CPU time and the peak memory of the command are added to child_cpu_time and child_max_rss of the TaskLog
+    of the task, which is currently rerun in this thread. This is not possible, if input or timeout are used.
+    If the output of the task is captured (see Workflow.run), the stderr of the command is captured as well.
+    """
+    _capture_stderr(kwargs)
+    if not hasattr(os, "wait4") or "input" in kwargs or "timeout" in kwargs:
+        return subprocess.check_output(*args, **kwargs)
+    if "stdout" in kwargs:
+        raise ValueError("stdout argument not allowed, it will be overridden.")
+    with subprocess.Popen(*args, stdout=subprocess.PIPE, **kwargs) as process:
+        # Both pipes are drained (like communicate does), before the child is reaped with wait4
+        stderr = []
+        stderr_reader = None
+        if process.stderr is not None:
+            stderr_reader = threading.Thread(target=lambda: stderr.append(process.stderr.read()), daemon=True)
+            stderr_reader.start()
+        output = process.stdout.read()
+        if stderr_reader is not None:
+            stderr_reader.join()
+        _, status, usage = os.wait4(process.pid, 0)
+        process.returncode = _exit_code(status)
+    stderr = stderr[0] if stderr else None
+    child_usage = getattr(_child_usage, "current", None)
+    if child_usage is not None:
+        child_usage[0] += usage.ru_utime + usage.ru_stime
+        child_usage[1] = max(child_usage[1] or 0, _rss_bytes(usage.ru_maxrss))
+    if process.returncode:
+        raise subprocess.CalledProcessError(process.returncode, process.args, output=output, stderr=stderr)
+    return output
+
+
+def _exit_code(status):
+    """Return the returncode (like subprocess) of a wait status. os.waitstatus_to_exitcode needs Python 3.9."""
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+def _capture_stderr(kwargs):
+    """Send the stderr of a command to the output file of the current task, if its output is captured"""
+    target = output.current()
+    if target is not None and "stderr" not in kwargs:
+        target.flush()
+        kwargs["stderr"] = target
+
+
+async def acmd(args, shell=False, **kwargs):
+    """Asynchronous version of cmd based on asyncio subprocesses. Can be awaited in an async action.
+
+    Returns the output of the command and raises a subprocess.CalledProcessError, if the returncode is not 0.
+    Additional keyword arguments are passed to asyncio.create_subprocess_exec (or _shell if shell=True).
+    """
+    kwargs.setdefault("stdout", subprocess.PIPE)
+    _capture_stderr(kwargs)
+    if shell is True:
+        process = await asyncio.create_subprocess_shell(args, **kwargs)
+    else:
+        if isinstance(args, str):
+            args = [args]
+        process = await asyncio.create_subprocess_exec(*args, **kwargs)
+    output, stderr = await process.communicate()
+    if process.returncode:
+        raise subprocess.CalledProcessError(process.returncode, args, output=output, stderr=stderr)
+    return output
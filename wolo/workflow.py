@@ -1,11 +1,30 @@
 from multiprocessing.pool import Pool, ThreadPool
+import multiprocessing
+import asyncio
+import contextlib
+from collections.abc import Iterator
 import itertools
+import os
+import pickle
+import queue
+import threading
+import time
+import timeit
+import uuid
 
-from .helper import pretty_print_index, cut_or_pad
+from . import output
+from .cache import use_log_dic
+from .helper import pretty_print_index, cut_or_pad, to_thread
 from .log import Log, TaskLog
+from .parameters import File, Source, prefetch, _source_file_state
+from .task import Task
 
 num_of_threads = 4
 multicore_switch = False
+remote_address = None
+remote_authkey = None
+resource_capacities = {}
+batch_duration = 0.05
 
 class Workflow():
     """Provide a Scaffold class to build a workflow.
@@ -22,6 +41,12 @@ class Workflow():
     MyWorkflow("MyName").run()
     For each workflow, there will be a logfile created with this name. Therefore, specify a name, if you use a workflow multiple times.
     You can pass Parameter to the workflow instance. They are available as self.args and self.kwargs.
+    For very large workflows the tasktree can be lazy: Instead of Task instances it can contain task factories (any
+    callable returning a Task, e.g. functools.partial(MyTask, arg)) and instead of lists it can contain generators
+    (tasktree itself can be a generator function). Factories are only called when the scheduler reaches them and
+    the Task is released after it ran. Note that the dag mode and plan() need to create all Tasks upfront.
+    The storage backend of the log can be changed by setting the log_backend class attribute (see wolo.log.Log).
+    For large workflows "journal" or "sqlite" are recommended, as they only write the TaskLogs that changed.
 
     Example Workflow:
 
@@ -36,6 +61,7 @@ class Workflow():
             # print some logging information
 
     """
+    log_backend = "json"
 
     def __init__(self, name=None, log_dic=None, *args, **kwargs):
         self._name = type(self).__name__
@@ -43,8 +69,10 @@ class Workflow():
             self._name = "{}_{}".format(self._name, name)
         self.args = args
         self.kwargs = kwargs
-        self.log = Log(self._name, log_dic=log_dic)
-        self.tasklist = self.tasktree()
+        self.log = Log(self._name, log_dic=log_dic, backend=self.log_backend)
+        # All files of the tasktree are checked in bulk, after all Tasks are created
+        with use_log_dic(log_dic), prefetch():
+            self.tasklist = self.tasktree()
 
     def before(self):
         """Empty method, that can be overwritten by user. Is called on initialization of a workflow."""
@@ -54,35 +82,768 @@ class Workflow():
         """Empty method, that can be overwritten by user. Is called after the workflow ran."""
         pass
 
-    def run(self, return_result=False, _start_level=[]):
-        """Run all the tasks returned by the self.tasktree() method."""
+    def run(self, return_result=False, dag=False, keep_going=False, capture=False, _start_level=[], _context=None):
+        """Run all the tasks returned by the self.tasktree() method.
+
+        If more than one thread is used, the branches of the parallel groups are started in the order of their
+        estimated duration (longest first), which is based on the execution_time of the tasks in the log.
+        dag: If True, the nested lists of the tasktree are ignored for scheduling. Instead, a Task depends on all
+             earlier Tasks, which have one of its input files (wolo.File) as output, and it is started as soon as
+             these Tasks are finished. The log keeps the nested layout of the tasktree.
+        keep_going: If True, the run does not stop at the first failed task. Only tasks that have an input file,
+                    which is the output of a failed (or skipped) task, are skipped. All failures are reported at
+                    the end.
+        capture: If True, everything a task prints (also tracebacks and the stderr of wolo.cmd) is written to a file
+                 in .wolo/output/<workflow name> instead of stdout. The path is stored as output in the TaskLog, if
+                 the task reran. Only a single progress line per task is printed (see wolo.output).
+        """
         self.before()
-        if all(isinstance(step, (list, tuple)) for step in self.tasklist):
+        self.tasklist = _materialize(self.tasklist)
+        if all(_is_list(step) for step in self.tasklist):
             self.tasklist = [self.tasklist]
-        success, new_log = _run_tasks(self.tasklist, self.log.log, level=_start_level)
+        if _context is None:
+            # Only the outermost workflow owns the executor. Nested workflows share it.
+            failures = _Failures() if keep_going is True else None
+            output_dir = self._output_dir() if capture is True else None
+            executor = _Executor.create()
+            context = _RunContext(checkpoint=self.log.checkpoint, executor=executor, failures=failures,
+                                  output_dir=output_dir, resources=_ResourcePool.create(executor),
+                                  log_dic=self._log_parent())
+        else:
+            context = _context.nested(self.log.checkpoint, self._output_dir(), self._log_parent())
+        if context.executor is not None:
+            context.executor.register(self.tasklist)
+        if _context is None and context.output_dir is not None:
+            if context.executor is not None:
+                # A fork while the progress writer thread holds the lock of stdout would deadlock the workers
+                context.executor.start()
+            output.start()
+        try:
+            # Also Tasks created by factories while running use the caches next to the log
+            with use_log_dic(context.log_dic):
+                if dag is True:
+                    success, new_log = _run_dag(self.tasklist, self.log.log, level=_start_level, context=context)
+                else:
+                    success, new_log = _run_tasks(self.tasklist, self.log.log, level=_start_level, context=context)
+        finally:
+            if _context is None and context.executor is not None:
+                context.executor.close()
+            if _context is None and context.resources is not None:
+                context.resources.close()
+            if _context is None and context.output_dir is not None:
+                output.stop()
         self.log._set_log(new_log)
+        self.log.checkpoint.clear()
+        if _context is None and context.failures is not None:
+            context.failures.report()
         self.after()
         if return_result is True:
             return success, self.log.log
         else:
             print(success)
 
+    def plan(self, threads=16, _start_level=[]):
+        """Return all tasks that would be rerun by self.run() and why, without running anything.
+
+        The parameters of all tasks are updated and compared with the log in threads parallel (which helps a lot
+        on network filesystems). Tasks, which have an input file that is the output of a task that would be rerun,
+        are reported as well.
+
+        threads: Number of threads used for the checks
+        Returns: Dictionary with the underscore index of the task as key and a tuple (task_class, [reasons]) as value
+        """
+        tasklist = self.tasklist = _materialize(self.tasklist)
+        if all(_is_list(step) for step in tasklist):
+            tasklist = [tasklist]
+        nodes = _collect_nodes(tasklist, self.log.log, level=_start_level)[1]
+        _link_nodes(nodes)
+        with ThreadPool(threads) as p:
+            results = p.starmap(_plan_node, ((node.step, node.task_log, node.index, threads, self._log_parent())
+                                             for node in nodes))
+        plan = {}
+        stale = set()
+        for node, result in zip(nodes, results):
+            # The nodes are in tree order, so all predecessors of a node are already handled
+            if node in stale and not isinstance(node.step, Workflow):
+                key = pretty_print_index(node.index, style="underscore")
+                task_class, reasons = result.get(key, (type(node.step).__name__, []))
+                result[key] = (task_class, reasons + ["input file is the output of a task that reruns"])
+            if result:
+                plan.update(result)
+                stale.update(node.successors)
+        return plan
+
+    async def arun(self, return_result=False, limit=100, keep_going=False, capture=False, _start_level=[],
+                   _context=None):
+        """Run all the tasks returned by the self.tasktree() method using asyncio.
+
+        Tasks with async methods (see wolo.Task) are awaited directly, so that many I/O bound tasks can run
+        concurrently in a single thread. All other tasks are run in threads of the default executor of the event
+        loop. Parallel groups of the tasktree are gathered.
+
+        limit: Maximal number of tasks, that run at the same time
+        keep_going, capture: See run()
+
+        Usage: asyncio.run(MyWorkflow().arun())
+        """
+        self.before()
+        self.tasklist = _materialize(self.tasklist)
+        if all(_is_list(step) for step in self.tasklist):
+            self.tasklist = [self.tasklist]
+        if _context is None:
+            failures = _Failures() if keep_going is True else None
+            output_dir = self._output_dir() if capture is True else None
+            context = _RunContext(checkpoint=self.log.checkpoint, semaphore=asyncio.Semaphore(limit), failures=failures,
+                                  output_dir=output_dir, resources=_ResourcePool.create(asynchronous=True),
+                                  log_dic=self._log_parent())
+        else:
+            context = _context.nested(self.log.checkpoint, self._output_dir(), self._log_parent())
+        if _context is None and context.output_dir is not None:
+            output.start()
+        try:
+            with use_log_dic(context.log_dic):
+                success, new_log = await _arun_tasks(self.tasklist, self.log.log, level=_start_level, context=context)
+        finally:
+            if _context is None and context.resources is not None:
+                context.resources.close()
+            if _context is None and context.output_dir is not None:
+                output.stop()
+        self.log._set_log(new_log)
+        self.log.checkpoint.clear()
+        if _context is None and context.failures is not None:
+            context.failures.report()
+        self.after()
+        if return_result is True:
+            return success, self.log.log
+        else:
+            print(success)
 
-def set_Threads(number=4, multicore=False):
+
+    def watch(self, interval=1.0, dag=False, max_polls=None):
+        """Run the workflow and stay resident to rerun only the affected tasks, whenever one of its files changes.
+
+        After the first run, the tasktree and the log are kept in memory and all wolo.File in- and outputs are
+        polled every interval seconds. The tasks using a changed file and all tasks depending on them (based on their
+        files, like in the dag mode) are checked again in the order of the tasktree and rerun, if needed. Tasks that
+        depend on a failed task are skipped until the next change.
+        Changed code can not be reloaded. Therefore, watch returns as soon as the source file of a wolo.Source input
+        changes, so that the script can be started again. It also returns after max_polls polls (if given) and on
+        KeyboardInterrupt.
+
+        dag: See run() (only used for the first run)
+        """
+        # Task factories are created once and kept in the tree, so that the same Tasks are watched and rerun
+        for _ in _iter_workflow_steps(self):
+            pass
+        self.run(return_result=True, dag=dag)
+        log, nodes = _collect_nodes(self.tasklist, self.log.log)
+        _link_nodes(nodes)
+        watcher = _Watcher(nodes)
+        print("watching {} files".format(len(watcher.files)))
+        polls = 0
+        try:
+            while max_polls is None or polls < max_polls:
+                time.sleep(interval)
+                polls += 1
+                changed_files, changed_sources = watcher.poll()
+                if changed_sources:
+                    print("source changed: {}".format(", ".join(sorted(changed_sources))))
+                    print("Restart the workflow to load the changed code.")
+                    return
+                if changed_files:
+                    self._rerun_affected(log, nodes, changed_files, watcher)
+        except KeyboardInterrupt:
+            pass
+
+    def _rerun_affected(self, log, nodes, changed_files, watcher):
+        """Check (and rerun) all nodes, that use one of the changed_files, and their successors. Used by watch()."""
+        start_time = timeit.default_timer()
+        affected = set()
+        blocked = set()
+        rerun_files = set()
+        num_checked = 0
+        success = True
+        context = _RunContext(checkpoint=self.log.checkpoint, log_dic=self._log_parent())
+        # The nodes are in tree order, so all predecessors of a node are already handled
+        for node in nodes:
+            if node not in affected and not (node.inputs | node.outputs) & changed_files:
+                continue
+            affected.update(node.successors)
+            num_checked += 1
+            if node in blocked:
+                blocked.update(node.successors)
+                success = False
+                print("skipping {} {}, because it depends on a failed task".format(pretty_print_index(node.index),
+                                                                                   type(node.step).__name__))
+                continue
+            with use_log_dic(context.log_dic):
+                _refresh(node.step)
+            node_success, node.task_log = _run_node(node.step, node.task_log, node.index, context)
+            node.container[node.position] = node.task_log
+            rerun_files |= node.outputs
+            if node_success is False:
+                success = False
+                blocked.update(node.successors)
+        self.log._set_log(log)
+        self.log.checkpoint.clear()
+        # Changes the tasks made themselves must not trigger the next check
+        watcher.refresh(rerun_files)
+        print("checked {} tasks in {:.0f}ms".format(num_checked, (timeit.default_timer() - start_time) * 1000))
+        print(success)
+
+    def _output_dir(self):
+        return self.log._log_dic / "output" / self._name
+
+    def _log_parent(self):
+        """Return the folder, which contains the .wolo folder of the log (and of the hash and artifact cache)."""
+        return self.log._log_dic.parent
+
+
+def set_Threads(number=4, multicore=False, batch_time=0.05):
+    """Set the number of threads (or processes, if multicore is True) used to run the parallel groups.
+
+    batch_time: Branches, which are sent to worker processes (or remote workers), are grouped into batches, that run
+                for about batch_time seconds each (based on the observed runtime of earlier branches). This
+                amortizes the overhead of sending many tiny branches. Use 0 to send every branch on its own.
+    """
     global num_of_threads
     num_of_threads = number
     global multicore_switch
     multicore_switch = multicore
+    global batch_duration
+    batch_duration = batch_time
+
+
+def set_Remote(address=None, authkey=None):
+    """Run the parallel groups of all workflows on the workers of the wolo.remote broker at address (host, port).
+
+    authkey is the password of the broker (bytes or str). Use set_Remote() to switch back to local execution.
+    """
+    global remote_address
+    remote_address = address
+    global remote_authkey
+    if isinstance(authkey, str):
+        authkey = authkey.encode("utf-8")
+    remote_authkey = authkey
+
+
+def set_Resources(**capacities):
+    """Set the capacities of the machine, which the tasks of Workflow.run() and arun() are packed against.
+
+    Every task declares its needs in its resources class attribute (see wolo.Task) and only starts, when all of
+    them fit into what is left of the capacities. Example: set_Resources(cores=16, memory=64 * 2**30, matlab_license=2)
+    The number of threads (see set_Threads) still limits the number of tasks that run at the same time, so it should
+    be at least as large as the number of tasks, that can fit. Use set_Resources() to switch the packing off.
+    """
+    global resource_capacities
+    resource_capacities = capacities
+
+
+class _Executor():
+    """Long-lived worker pool, which is shared by all parallel groups (and nested workflows) of a Workflow.run().
+
+    Threads: A single ThreadPool with num_of_threads threads. The outermost groups wait for a free thread for each
+    branch, so the pool is kept busy. Groups inside the pool only hand a branch to the pool, if one of the threads
+    is free. Otherwise the calling pool thread runs the branch itself. Therefore, nested groups never wait for
+    threads that are blocked by their parents and at most num_of_threads branches run at once.
+    Processes: A single Pool with num_of_threads processes. The groups of the main process submit all their
+    branches to the pool. The executor is not passed to the worker processes, so nested groups inside a worker run
+    their branches one after another.
+    If the platform supports it, the worker processes are forked, when the first branch is submitted. All parts of
+    the tasktree, which were registered before (see register), are inherited by the workers (copy-on-write). For
+    these only a reference (their id) is sent to the workers instead of the pickled Tasks. Note that changes the
+    Tasks make to themselves inside a worker are still not visible in the main process.
+    The branches of a parallel group are sent to the processes in batches (see _Batcher).
+    """
+    def __init__(self, number, multicore=False):
+        self.multicore = multicore
+        self._number = number
+        self._registered = set()
+        self._forked = None
+        self._batcher = _Batcher(number)
+        if multicore is True:
+            self._pool = None
+        else:
+            self._pool = ThreadPool(number)
+            self._free = threading.Semaphore(number)
+            self._inside = threading.local()
+
+    @classmethod
+    def create(cls):
+        """Return a new executor based on the settings of set_Threads() and set_Remote() or None, if only one
+        thread is used."""
+        if remote_address is not None:
+            return _RemoteExecutor(remote_address, remote_authkey)
+        if num_of_threads == 1:
+            return None
+        return cls(num_of_threads, multicore=multicore_switch)
+
+    def start(self):
+        """Fork the worker processes now instead of at the first parallel group. Objects registered afterwards are
+        not inherited by the workers."""
+        if self.multicore is True:
+            self._process_pool()
+
+    def register(self, task_list):
+        """Register all (sub)lists and steps of a tasktree, so that the forked workers can inherit them."""
+        if not self.multicore or self._forked is not None:
+            return
+        for obj in _iter_tree_objects(task_list):
+            _fork_registry[id(obj)] = obj
+            self._registered.add(id(obj))
+
+    def _process_pool(self):
+        if self._pool is None:
+            if "fork" in multiprocessing.get_all_start_methods():
+                self._forked = frozenset(self._registered)
+                self._pool = multiprocessing.get_context("fork").Pool(self._number)
+            else:
+                self._forked = frozenset()
+                self._pool = Pool(self._number)
+        return self._pool
+
+    def _reference(self, args):
+        return (func_arg if id(func_arg) not in self._forked or _fork_registry.get(id(func_arg)) is not func_arg
+                else _Forked(id(func_arg)) for func_arg in args)
+
+    def starmap(self, func, iterable):
+        if self.multicore is True:
+            pool = self._process_pool()
+            return self._batcher.starmap(pool.apply_async, func, [tuple(self._reference(args)) for args in iterable])
+        results = []
+        inside = getattr(self._inside, "pool", False)
+        for args in iterable:
+            if self._free.acquire(blocking=not inside):
+                results.append((True, self._pool.apply_async(self._call, (func, args))))
+            else:
+                results.append((False, func(*args)))
+        return [result.get() if submitted else result for submitted, result in results]
+
+    def apply_async(self, func, args, callback, error_callback):
+        """Submit a single call and wait for a free thread, if necessary. Must not be called from inside the pool."""
+        if self.multicore is True:
+            pool = self._process_pool()
+            return pool.apply_async(_call_forked, (func, tuple(self._reference(args))), callback=callback,
+                                    error_callback=error_callback)
+        self._free.acquire()
+        return self._pool.apply_async(self._call, (func, args), callback=callback, error_callback=error_callback)
+
+    def _call(self, func, args):
+        self._inside.pool = True
+        try:
+            return func(*args)
+        finally:
+            self._free.release()
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+        for key in self._registered:
+            _fork_registry.pop(key, None)
+
+
+class _RemoteExecutor():
+    """Executor, which sends the branches of all parallel groups to the workers of a wolo.remote.Broker.
+
+    All branches are submitted at once (in batches, see _Batcher) and the broker queues them until a worker is free. A background thread
+    receives the results and hands them to the waiting groups. Nested groups inside a worker run their branches
+    one after another (like for processes).
+    """
+    def __init__(self, address, authkey):
+        # Imported here, so that "python -m wolo.remote" does not import the module twice
+        from .remote import Broker
+        self._broker = Broker(address=address, authkey=authkey)
+        self._broker.connect()
+        self._jobs = self._broker.get_jobs()
+        self._client_id = uuid.uuid4().hex
+        self._results = self._broker.get_results(self._client_id)
+        self._job_ids = itertools.count()
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._batcher = _Batcher(num_of_threads)
+        self._receiver = threading.Thread(target=self._receive, daemon=True)
+        self._receiver.start()
+
+    def start(self):
+        pass
+
+    def register(self, task_list):
+        pass
+
+    def starmap(self, func, iterable):
+        return self._batcher.starmap(self.apply_async, func, list(iterable))
+
+    def apply_async(self, func, args, callback, error_callback):
+        job_id = next(self._job_ids)
+        with self._lock:
+            self._pending[job_id] = (callback, error_callback)
+        self._jobs.put((self._client_id, job_id, os.getcwd(), pickle.dumps((func, tuple(args)))))
+
+    def _receive(self):
+        while True:
+            try:
+                message = self._results.get()
+            except (EOFError, OSError) as error:
+                with self._lock:
+                    pending, self._pending = self._pending, {}
+                for callback, error_callback in pending.values():
+                    error_callback(ConnectionError("Lost the connection to the broker: {}".format(error)))
+                return
+            if message is None:
+                return
+            job_id, no_error, payload = message
+            with self._lock:
+                callback, error_callback = self._pending.pop(job_id)
+            try:
+                result = pickle.loads(payload)
+            except Exception as error:
+                no_error, result = False, error
+            if no_error is True:
+                callback(result)
+            else:
+                error_callback(result)
+
+    def close(self):
+        try:
+            self._results.put(None)
+            self._receiver.join()
+            self._broker.drop_results(self._client_id)
+        except (EOFError, OSError):
+            pass
+
+
+class _RemoteResult():
+    def __init__(self):
+        self._done = threading.Event()
+        self._result = None
+        self._error = None
+
+    def set(self, result):
+        self._result = result
+        self._done.set()
 
+    def set_error(self, error):
+        self._error = error
+        self._done.set()
 
-def _run_tasks(task_list, log, level=[]):
+    def get(self):
+        self._done.wait()
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+
+class _Batcher():
+    """Sends the branches of parallel groups in batches, that run for about batch_duration seconds each (see
+    set_Threads).
+
+    The batch size is based on the mean runtime of a branch (latency), which is measured in the workers and is
+    updated after every batch. As long as it is not known, the first branches (one per worker) are sent on their
+    own and the rest is only sent, when the first of them finished. Batches are never so large, that a worker gets
+    less than 4 batches of a group, so that the load is still balanced.
+    workers: Number of workers, which run the batches
+    """
+    def __init__(self, workers):
+        self.workers = workers
+        self.latency = None
+        self._lock = threading.Lock()
+
+    def _size(self, remaining):
+        if batch_duration <= 0 or not self.latency:
+            return 1
+        balanced = -(-remaining // (4 * self.workers))
+        return max(1, min(int(batch_duration / self.latency), balanced))
+
+    def _observe(self, batch):
+        with self._lock:
+            for elapsed, _ in batch:
+                self.latency = elapsed if self.latency is None else 0.8 * self.latency + 0.2 * elapsed
+
+    def starmap(self, apply_async, func, args_list):
+        """Run func for all args of args_list using apply_async (of a Pool or a _RemoteExecutor) and return the
+        results in order."""
+        jobs = []
+        first_done = threading.Event()
+
+        def submit(batch):
+            job = _RemoteResult()
+
+            def callback(results):
+                self._observe(results)
+                job.set(results)
+                first_done.set()
+
+            def error_callback(error):
+                job.set_error(error)
+                first_done.set()
+
+            apply_async(_call_batch, (func, batch), callback=callback, error_callback=error_callback)
+            jobs.append(job)
+
+        start = 0
+        if self.latency is None and batch_duration > 0 and len(args_list) > self.workers:
+            for args in args_list[:self.workers]:
+                submit([args])
+            start = self.workers
+            first_done.wait()
+        while start < len(args_list):
+            size = self._size(len(args_list) - start)
+            submit(args_list[start:start + size])
+            start += size
+        return [result for job in jobs for _, result in job.get()]
+
+
+def _call_batch(func, batch):
+    """Call func for all args of a batch and return the runtime and result of every call. Runs inside the workers."""
+    results = []
+    for args in batch:
+        start_time = timeit.default_timer()
+        result = _call_forked(func, args)
+        results.append((timeit.default_timer() - start_time, result))
+    return results
+
+
+_fork_registry = {}
+
+
+class _Forked():
+    """Reference to an object, which a forked worker process inherited from the main process"""
+    def __init__(self, key):
+        self.key = key
+
+
+def _call_forked(func, args):
+    """Replace all references to inherited objects and call func. Runs inside the worker processes."""
+    return func(*(_fork_registry[arg.key] if isinstance(arg, _Forked) else arg for arg in args))
+
+
+def _iter_tree_objects(task_list):
+    """Yields all lists and steps of a tasktree (including the tasktrees of nested workflows). Lazy parts are skipped."""
+    if not isinstance(task_list, (list, tuple)):
+        return
+    yield task_list
+    for step in task_list:
+        if isinstance(step, (list, tuple)):
+            yield from _iter_tree_objects(step)
+        elif isinstance(step, Workflow):
+            yield step
+            yield from _iter_tree_objects(step.tasklist)
+        else:
+            yield step
+
+
+class _RunContext():
+    """Holds the state of a single Workflow.run(), which is passed down to all _run_tasks calls (also into the
+    worker processes, so it needs to be pickable).
+
+    checkpoint: wolo.log.Checkpoint, which every finished TaskLog is committed to
+    executor: the shared _Executor (or _RemoteExecutor) of the run (None in worker processes and if only one thread
+              is used)
+    semaphore: asyncio.Semaphore, which limits the number of concurrent tasks (only used by Workflow.arun())
+    failures: _Failures of the run, if it is run with keep_going=True
+    output_dir: folder for the output files of the tasks of the current workflow, if it is run with capture=True
+    resources: _ResourcePool of the run, if capacities are set (see set_Resources)
+    log_dic: folder with the .wolo folder of the current workflow, which holds the caches (see wolo.cache.use_log_dic)
+    """
+    def __init__(self, checkpoint=None, executor=None, semaphore=None, failures=None, output_dir=None,
+                 resources=None, log_dic=None):
+        self.checkpoint = checkpoint
+        self.executor = executor
+        self.semaphore = semaphore
+        self.failures = failures
+        self.output_dir = output_dir
+        self.resources = resources
+        self.log_dic = log_dic
+        self._resumed = {}
+        if checkpoint:
+            self._resumed = checkpoint.load()
+
+    def nested(self, checkpoint, output_dir, log_dic):
+        """Return the context for a nested workflow, which shares everything but the checkpoint, the output
+        folder and the log folder with this one."""
+        if self.output_dir is None:
+            output_dir = None
+        return _RunContext(checkpoint=checkpoint, executor=self.executor, semaphore=self.semaphore,
+                           failures=self.failures, output_dir=output_dir, resources=self.resources, log_dic=log_dic)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["executor"] = None
+        state["semaphore"] = None
+        return state
+
+    def resume(self, index, task_class, task_log):
+        """Return the TaskLog committed by a previous (killed) run for this task instead of task_log, if available."""
+        resumed = self._resumed.get(pretty_print_index(index, style="underscore"))
+        if resumed and resumed.task_class == task_class:
+            return resumed
+        return task_log
+
+    def commit(self, task_log):
+        if self.checkpoint:
+            self.checkpoint.commit(task_log)
+
+
+class _Failures():
+    """Collects the failed and skipped tasks of a run with keep_going=True together with their output files.
+
+    Threads share one instance. Worker processes work on a copy, which is exported at the end of each branch and
+    merged back into the instance of the main process.
+    """
+    def __init__(self):
+        self.failed = {}
+        self.skipped = {}
+        self.tainted = set()
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        return self.export()
+
+    def __setstate__(self, state):
+        self.__init__()
+        self.merge(state)
+
+    def add(self, kind, index, step):
+        """Add a failed or skipped (kind) step. All its output files are tainted."""
+        with self._lock:
+            getattr(self, kind)[pretty_print_index(index, style="underscore")] = type(step).__name__
+            self.tainted |= _file_paths(step)[1]
+
+    def is_tainted(self, step):
+        with self._lock:
+            return not self.tainted.isdisjoint(_file_paths(step)[0])
+
+    def export(self):
+        with self._lock:
+            return dict(self.failed), dict(self.skipped), set(self.tainted)
+
+    def merge(self, exported):
+        failed, skipped, tainted = exported
+        with self._lock:
+            self.failed.update(failed)
+            self.skipped.update(skipped)
+            self.tainted |= tainted
+
+    def report(self):
+        for kind in ("failed", "skipped"):
+            tasks = getattr(self, kind)
+            if tasks:
+                print("{} tasks {}:".format(len(tasks), kind))
+                for index, task_class in sorted(tasks.items()):
+                    print("    {} {}".format(index, task_class))
+
+
+class _ResourcePool():
+    """The capacities of set_Resources() and the amounts, that are currently used by running tasks.
+
+    A task acquires all its needs at once, as soon as all of them fit, and releases them after it ran. Needs larger
+    than the capacity are reduced to the capacity (the task then runs alone), so that it can not wait forever.
+    Waiting tasks are not queued, so a small task can overtake a large one, that does not fit yet.
+    Processes: The used amounts are stored in shared memory and the pool is inherited by the forked worker
+    processes. It is only sent as a reference (like the _Forked tasks). In worker processes, which are not forked,
+    and on remote workers, the tasks are not packed.
+    asynchronous: Use an asyncio.Condition for Workflow.arun() (see aacquire)
+    """
+    def __init__(self, capacities, multicore=False, asynchronous=False):
+        self._names = sorted(capacities)
+        self._capacities = [float(capacities[name]) for name in self._names]
+        if asynchronous:
+            self._condition = asyncio.Condition()
+            self._used = [0.0] * len(self._names)
+        elif multicore and "fork" in multiprocessing.get_all_start_methods():
+            fork_context = multiprocessing.get_context("fork")
+            self._condition = fork_context.Condition()
+            self._used = fork_context.RawArray("d", len(self._names))
+        else:
+            self._condition = threading.Condition()
+            self._used = [0.0] * len(self._names)
+        _resource_pools[id(self)] = self
+
+    @classmethod
+    def create(cls, executor=None, asynchronous=False):
+        """Return a new pool for the capacities of set_Resources() or None, if none are set."""
+        if not resource_capacities:
+            return None
+        return cls(resource_capacities, multicore=getattr(executor, "multicore", False), asynchronous=asynchronous)
+
+    def __reduce__(self):
+        return _inherited_resource_pool, (id(self),)
+
+    def _needs(self, step):
+        resources = getattr(step, "resources", None) or {}
+        return [min(float(resources.get(name, 0)), capacity) for name, capacity in zip(self._names, self._capacities)]
+
+    def _fits(self, needs):
+        return all(used + need <= capacity + 1e-9 for used, need, capacity in zip(self._used, needs, self._capacities))
+
+    def _add(self, needs, sign):
+        for i, need in enumerate(needs):
+            self._used[i] += sign * need
+
+    @contextlib.contextmanager
+    def acquire(self, step):
+        """Wait until the needs of step fit and hold them in the with block."""
+        needs = self._needs(step)
+        if not any(needs):
+            yield
+            return
+        with self._condition:
+            self._condition.wait_for(lambda: self._fits(needs))
+            self._add(needs, 1)
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._add(needs, -1)
+                self._condition.notify_all()
+
+    @contextlib.asynccontextmanager
+    async def aacquire(self, step):
+        """Asynchronous version of acquire for pools created with asynchronous=True."""
+        needs = self._needs(step)
+        if not any(needs):
+            yield
+            return
+        async with self._condition:
+            await self._condition.wait_for(lambda: self._fits(needs))
+            self._add(needs, 1)
+        try:
+            yield
+        finally:
+            async with self._condition:
+                self._add(needs, -1)
+                self._condition.notify_all()
+
+    def close(self):
+        _resource_pools.pop(id(self), None)
+
+
+_resource_pools = {}
+
+
+def _inherited_resource_pool(key):
+    """Return the _ResourcePool, which a forked worker process inherited, or None (no packing)."""
+    return _resource_pools.get(key)
+
+
+def _acquire_resources(step, context):
+    if context and context.resources is not None:
+        return context.resources.acquire(step)
+    return contextlib.nullcontext()
+
+
+def _run_tasks(task_list, log, level=[], context=None):
     """Run a list of tasks and return the log and success information.
 
     This is the main function of the module. It is called by the Workflow.run() method. It automatically runs tasks, that can be run in parallel in MultiThreads.
+    If a _RunContext is passed, every TaskLog is commited to its checkpoint as soon as the task reran.
     """
+    task_list = _materialize(task_list)
     if not isinstance(log, list):
         log = []
     success = False
+    failed = False
     num_of_tasks = len(task_list)
     for i, step, task_log in cut_or_pad(task_list, log, enum=True):
         if num_of_tasks == 1:
@@ -92,59 +853,569 @@ def _run_tasks(task_list, log, level=[]):
 
         if not task_log:
             log.append(task_log)
+        step = _resolve_step(task_list, i)
 
         if isinstance(step, Workflow):
-            task_success, new_task_log = step.run(return_result=True, _start_level=index)
+            task_success, new_task_log = step.run(return_result=True, _start_level=index, _context=context)
 
-        elif isinstance(step, (list, tuple)):  # checks if a step is actual a substep (list of steps)
+        elif _is_list(step):  # checks if a step is actual a substep (list of steps)
             subtasklist = step
             # checks if current log is a list (as needed for subtasks). if not creates an empty one
             if not isinstance(task_log, list):
                 task_log = []
 
             # checks if all elements in the subtask list are nested --> parallel run, otherwise linear run
-            if all(isinstance(step, (list, tuple)) for step in subtasklist):
+            if all(_is_list(step) for step in subtasklist):
+                subtasklist = _materialize_branches(subtasklist)
                 sub_index, subtasklist, task_log = zip(*cut_or_pad(subtasklist, task_log, enum=True))
                 sub_index = list((index + ["p" + str(i)] for i in sub_index))
-                if num_of_threads == 1:
-                    list_success, list_log = zip(*itertools.starmap(_run_tasks_wrapper, zip(subtasklist, task_log, sub_index)))
+                order = range(len(subtasklist))
+                if context and context.executor:
+                    starmap = context.executor.starmap
+                    # The longest branches are started first, so that they do not stretch the total runtime
+                    order = _longest_first(subtasklist, task_log)
                 else:
-                    if multicore_switch is True:
-                        multi_runner = Pool
-                    else:
-                        multi_runner = ThreadPool
-                    with multi_runner(num_of_threads) as p:
-                        list_success, list_log = zip(*p.starmap(_run_tasks_wrapper, zip(subtasklist, task_log, sub_index)))
+                    starmap = itertools.starmap
+                results = starmap(_run_tasks_wrapper, ((subtasklist[j], task_log[j], sub_index[j], context)
+                                                       for j in order))
+                results = [result for _, result in sorted(zip(order, results), key=lambda item: item[0])]
+                list_success, list_log, list_failures = zip(*results)
+                if context and context.failures is not None:
+                    for failures in list_failures:
+                        context.failures.merge(failures)
                 new_task_log = list(list_log)
                 task_success = all(list_success)
 
             else:
-                task_success, new_task_log = _run_tasks(subtasklist, task_log, level=index)
+                task_success, new_task_log = _run_tasks(subtasklist, task_log, level=index, context=context)
 
         else:
-            step_class = type(step).__name__
-            print(pretty_print_index(index), step_class)
-            # checks if current log is really a TaskLog object. if not create an empty one
-            if not isinstance(task_log, TaskLog):
-                task_log = TaskLog(index=[], task_class=step_class, last_run_success=None)
-
-            new_task_log = step._run(task_log)
-            new_task_log.index = index
-            task_success = new_task_log.last_run_success
+            task_success, new_task_log = _run_single_task(step, task_log, index, context)
 
         log[i] = new_task_log
         if task_success is False:
-            break
+            failed = True
+            if not (context and context.failures is not None):
+                break
 
     else:
-        success = True
+        success = not failed
         # This crops the log of tasks, that were removed from the tasktree
         log = log[:i + 1]
 
     return success, log
 
 
-def _run_tasks_wrapper(subtasklist, task_log, sub_index):
+def _run_single_task(step, task_log, index, context=None):
+    """Run a single Task and return its success and its new TaskLog."""
+    task_log = _prepare_task_log(step, task_log, index, context)
+    if _skip_task(step, index, context):
+        task_log.index = index
+        return False, task_log
+    old_task_log = dict(task_log)
+    with _acquire_resources(step, context), _use_log_dic(context), _capture(index, context) as output_path:
+        new_task_log = step._run(task_log)
+    return _finish_task_log(step, new_task_log, old_task_log, index, context, output_path)
+
+
+def _skip_task(step, index, context):
+    """Check if a task needs to be skipped, because one of its input files was not created by a failed task."""
+    if context and context.failures is not None and context.failures.is_tainted(step):
+        _report(context, "skipping Task, because it depends on a failed task",
+                "{} {}: skipped".format(pretty_print_index(index), type(step).__name__))
+        context.failures.add("skipped", index, step)
+        return True
+    return False
+
+
+def _prepare_task_log(step, task_log, index, context):
+    step_class = type(step).__name__
+    if not (context and context.output_dir is not None):
+        print(pretty_print_index(index), step_class)
+    # checks if current log is really a TaskLog object. if not create an empty one
+    if not isinstance(task_log, TaskLog):
+        task_log = TaskLog(index=[], task_class=step_class, last_run_success=None)
+    if context:
+        task_log = context.resume(index, step_class, task_log)
+    return task_log
+
+
+def _finish_task_log(step, new_task_log, old_task_log, index, context, output_path=None):
+    rerun = dict(new_task_log) != old_task_log
+    new_task_log.index = index
+    if output_path is not None:
+        _keep_output(new_task_log, output_path, rerun)
+    if context and rerun:
+        context.commit(new_task_log)
+    if context and context.failures is not None and new_task_log.last_run_success is False:
+        context.failures.add("failed", index, step)
+    return new_task_log.last_run_success, new_task_log
+
+
+def _use_log_dic(context):
+    """Use the caches in the .wolo folder of the current workflow for the task (see wolo.cache.use_log_dic)."""
+    if not (context and context.log_dic is not None):
+        return contextlib.nullcontext()
+    return use_log_dic(context.log_dic)
+
+
+def _capture(index, context):
+    """Capture the output of a task into a temporary file in the output folder, if the run captures output."""
+    if not (context and context.output_dir is not None):
+        return contextlib.nullcontext()
+    return output.capture(context.output_dir / ".{}.log.tmp".format(pretty_print_index(index, style="underscore")))
+
+
+def _keep_output(task_log, output_path, rerun):
+    """Keep the captured output of a task, if it reran (otherwise its old output is kept) and report its status."""
+    if rerun:
+        path = output_path.with_name(output_path.name[1:-len(".tmp")])
+        os.replace(str(output_path), str(path))
+        task_log.output = str(path)
+        status = "success" if task_log.last_run_success else "failed (see {})".format(path)
+        if task_log.execution_time is not None:
+            status += " in {:.3f}s".format(task_log.execution_time)
+    else:
+        os.unlink(str(output_path))
+        status = "up to date"
+    output.progress("{} {}: {}".format(pretty_print_index(task_log.index), task_log.task_class, status))
+
+
+def _report(context, message, progress_line):
+    if context and context.output_dir is not None:
+        output.progress(progress_line)
+    else:
+        print(message)
+
+
+def _is_list(step):
+    """Check if a step of the tasktree is a (sub)list of steps. Generators and other iterators are lazy lists."""
+    return isinstance(step, (list, tuple, Iterator))
+
+
+def _materialize(task_list):
+    """Turn a lazy list (generator/iterator) of the tasktree into a list"""
+    if isinstance(task_list, (list, tuple)):
+        return task_list
+    return list(task_list)
+
+
+def _materialize_branches(task_list):
+    """Turn all lazy branches of a parallel group into lists and store them in the tree, if possible"""
+    branches = [_materialize(branch) for branch in task_list]
+    if isinstance(task_list, list):
+        task_list[:] = branches
+    return branches
+
+
+def _resolve_step(task_list, i):
+    """Return the step at position i of the task_list.
+
+    Lazy lists are turned into lists and stored in the tree, so that the workflow can be run multiple times. Task
+    factories (any callable, e.g. a Task class or a functools.partial) are called to create the Task. The Task is not
+    stored in the tree, so it can be garbage collected after it ran.
+    """
+    step = task_list[i]
+    if _is_list(step):
+        step = _materialize(step)
+        if isinstance(task_list, list):
+            task_list[i] = step
+    elif callable(step) and not isinstance(step, (Task, Workflow)):
+        step = step()
+    return step
+
+
+def _iter_execution_times(task_log):
+    """Yields the execution_time of all TaskLogs of a (nested) log, which have one."""
+    if isinstance(task_log, TaskLog):
+        if task_log.execution_time is not None:
+            yield task_log.execution_time
+    elif isinstance(task_log, list):
+        for sub_log in task_log:
+            yield from _iter_execution_times(sub_log)
+
+
+def _estimate_duration(task_log, fallback, length=0):
+    """Estimate how long a step runs from the execution_time of its old TaskLog(s).
+
+    Parallel groups (lists of lists) count with their longest branch, all other lists with their sum. Tasks that
+    never ran (and lists shorter than length, the number of steps) count with fallback.
+    """
+    if isinstance(task_log, TaskLog):
+        return task_log.execution_time if task_log.execution_time is not None else fallback
+    if not isinstance(task_log, list) or not task_log:
+        return fallback * max(length, 1)
+    durations = [_estimate_duration(sub_log, fallback) for sub_log in task_log[:length or None]]
+    if all(isinstance(sub_log, list) for sub_log in task_log):
+        return max(durations)
+    return sum(durations) + fallback * max(length - len(task_log), 0)
+
+
+def _longest_first(branches, logs):
+    """Return the positions of the branches of a parallel group ordered by their estimated duration (longest first).
+
+    Tasks that never ran are estimated with the mean execution_time of all tasks of the group (0, if none ran yet).
+    Branches with the same estimate keep their order.
+    """
+    times = [time for branch_log in logs for time in _iter_execution_times(branch_log)]
+    fallback = sum(times) / len(times) if times else 0
+    estimates = [_estimate_duration(branch_log, fallback, len(branch)) for branch, branch_log in zip(branches, logs)]
+    return sorted(range(len(branches)), key=lambda j: -estimates[j])
+
+
+def _run_tasks_wrapper(subtasklist, task_log, sub_index, context=None):
     '''Needed to make the starmap function work with Multiprocess. Called function as to be importable --> Lambda is not possible.
-    Therefore, this wrapper function exists'''
-    return _run_tasks(subtasklist, task_log, sub_index)
+    Therefore, this wrapper function exists. It also returns the failures of a keep_going run, as the failures of
+    a worker process need to be merged back into the main process.'''
+    with _use_log_dic(context):
+        success, log = _run_tasks(subtasklist, task_log, sub_index, context=context)
+    failures = None
+    if context and context.failures is not None:
+        failures = context.failures.export()
+    return success, log, failures
+
+
+async def _arun_tasks(task_list, log, level=[], context=None):
+    """Asynchronous version of _run_tasks, which is used by Workflow.arun(). The branches of a parallel group are
+    gathered instead of being submitted to a pool."""
+    task_list = _materialize(task_list)
+    if not isinstance(log, list):
+        log = []
+    success = False
+    failed = False
+    num_of_tasks = len(task_list)
+    for i, step, task_log in cut_or_pad(task_list, log, enum=True):
+        if num_of_tasks == 1:
+            index = level
+        else:
+            index = level + [i]
+
+        if not task_log:
+            log.append(task_log)
+        step = _resolve_step(task_list, i)
+
+        if isinstance(step, Workflow):
+            task_success, new_task_log = await step.arun(return_result=True, _start_level=index, _context=context)
+
+        elif _is_list(step):
+            subtasklist = step
+            if not isinstance(task_log, list):
+                task_log = []
+
+            if all(_is_list(step) for step in subtasklist):
+                subtasklist = _materialize_branches(subtasklist)
+                branches = [_arun_tasks(sublist, sublist_log, level=index + ["p" + str(j)], context=context)
+                            for j, sublist, sublist_log in cut_or_pad(subtasklist, task_log, enum=True)]
+                list_success, list_log = zip(*await asyncio.gather(*branches))
+                new_task_log = list(list_log)
+                task_success = all(list_success)
+
+            else:
+                task_success, new_task_log = await _arun_tasks(subtasklist, task_log, level=index, context=context)
+
+        else:
+            task_success, new_task_log = await _arun_single_task(step, task_log, index, context)
+
+        log[i] = new_task_log
+        if task_success is False:
+            failed = True
+            if not (context and context.failures is not None):
+                break
+
+    else:
+        success = not failed
+        # This crops the log of tasks, that were removed from the tasktree
+        log = log[:i + 1]
+
+    return success, log
+
+
+async def _arun_single_task(step, task_log, index, context=None):
+    """Run a single Task inside the event loop (async tasks) or in a thread of the default executor (all others)."""
+    semaphore = context.semaphore if context and context.semaphore else _no_limit()
+    async with semaphore:
+        task_log = _prepare_task_log(step, task_log, index, context)
+        if _skip_task(step, index, context):
+            task_log.index = index
+            return False, task_log
+        old_task_log = dict(task_log)
+        resources = context.resources.aacquire(step) if context and context.resources is not None else _no_limit()
+        async with resources:
+            with _use_log_dic(context), _capture(index, context) as output_path:
+                if isinstance(step, Task) and step._is_async():
+                    new_task_log = await step._arun(task_log)
+                else:
+                    # to_thread passes the context (with the output target) to the thread
+                    new_task_log = await to_thread(step._run, task_log)
+        return _finish_task_log(step, new_task_log, old_task_log, index, context, output_path)
+
+
+@contextlib.asynccontextmanager
+async def _no_limit():
+    yield
+
+
+class _Node():
+    """A single Task or (nested) Workflow of the tasktree together with the place its TaskLog belongs to in the
+    nested log. Used by the dag scheduler."""
+    def __init__(self, step, task_log, index, container, position):
+        self.step = step
+        self.task_log = task_log
+        self.index = index
+        self.container = container
+        self.position = position
+        self.inputs, self.outputs = _file_paths(step)
+        self.successors = []
+        self.num_predecessors = 0
+        self.rank = 0
+
+
+def _file_paths(step):
+    """Return the (absolute) paths of all wolo.File inputs and outputs of a Task or of all Tasks in a Workflow"""
+    if isinstance(step, Workflow):
+        inputs, outputs = set(), set()
+        for sub_step in _iter_workflow_steps(step):
+            sub_inputs, sub_outputs = _file_paths(sub_step)
+            inputs |= sub_inputs
+            outputs |= sub_outputs
+        return inputs, outputs
+    paths = []
+    for para_dic in (getattr(step, "inputs", None), getattr(step, "outputs", None)):
+        if not para_dic:
+            paths.append(set())
+        else:
+            paths.append({os.path.abspath(str(para.path)) for para in para_dic if isinstance(para, File)})
+    return paths[0], paths[1]
+
+
+def _iter_steps(task_list):
+    """Yields all Tasks and Workflows of a nested tasktree. Task factories are instantiated and stored in the tree."""
+    task_list = _materialize(task_list)
+    for i in range(len(task_list)):
+        step = _resolve_step(task_list, i)
+        if _is_list(step):
+            yield from _iter_steps(step)
+        else:
+            if isinstance(task_list, list):
+                task_list[i] = step
+            yield step
+
+
+def _iter_workflow_steps(workflow):
+    """Yields all Tasks and Workflows of the tasktree of a workflow. A lazy tasktree is turned into a list and
+    stored in the workflow first, so that it is still there, when the workflow runs."""
+    workflow.tasklist = _materialize(workflow.tasklist)
+    return _iter_steps(workflow.tasklist)
+
+
+def _collect_nodes(task_list, log, level=[]):
+    """Walk the tasktree in the same way as _run_tasks and return the new (nested) log and a list of all _Node
+    objects. The log is prefilled with the old TaskLogs and is updated in place by the dag scheduler."""
+    task_list = _materialize(task_list)
+    if not isinstance(log, list):
+        log = []
+    new_log = list(log[:len(task_list)])
+    nodes = []
+    num_of_tasks = len(task_list)
+    for i, step, task_log in cut_or_pad(task_list, log, enum=True):
+        if num_of_tasks == 1:
+            index = level
+        else:
+            index = level + [i]
+
+        if i == len(new_log):
+            new_log.append(task_log)
+        step = _resolve_step(task_list, i)
+
+        if isinstance(step, Workflow):
+            if not isinstance(task_log, list):
+                new_log[i] = task_log = []
+            nodes.append(_Node(step, task_log, index, new_log, i))
+
+        elif _is_list(step):
+            if not isinstance(task_log, list):
+                task_log = []
+            if all(_is_list(sub_step) for sub_step in step):
+                new_log[i] = []
+                for j, sublist, sublist_log in cut_or_pad(step, task_log, enum=True):
+                    new_sublist_log, sub_nodes = _collect_nodes(sublist, sublist_log, level=index + ["p" + str(j)])
+                    new_log[i].append(new_sublist_log)
+                    nodes.extend(sub_nodes)
+            else:
+                new_log[i], sub_nodes = _collect_nodes(step, task_log, level=index)
+                nodes.extend(sub_nodes)
+
+        else:
+            # Tasks that are not run, because they depend on a failed task, keep this TaskLog
+            if not isinstance(task_log, TaskLog):
+                new_log[i] = task_log = TaskLog(index=index, task_class=type(step).__name__, last_run_success=None)
+            nodes.append(_Node(step, task_log, index, new_log, i))
+
+    return new_log, nodes
+
+
+def _link_nodes(nodes):
+    """Add an edge from every node to all later nodes, which have one of its output files as input."""
+    producers = {}
+    for node in nodes:
+        predecessors = {producer for path in node.inputs for producer in producers.get(path, [])}
+        for predecessor in predecessors:
+            predecessor.successors.append(node)
+        node.num_predecessors = len(predecessors)
+        for path in node.outputs:
+            producers.setdefault(path, []).append(node)
+
+
+def _rank_nodes(nodes):
+    """Set the rank of every node to the estimated duration of the longest path from it to the end of the dag
+    (see _estimate_duration). Edges only point to later nodes, so the nodes are ranked in reverse order."""
+    times = [time for node in nodes for time in _iter_execution_times(node.task_log)]
+    fallback = sum(times) / len(times) if times else 0
+    for node in reversed(nodes):
+        node.rank = (_estimate_duration(node.task_log, fallback) +
+                     max((successor.rank for successor in node.successors), default=0))
+
+
+class _Watcher():
+    """Polls the files of the nodes of a tasktree for Workflow.watch().
+
+    files: All wolo.File in- and outputs of the nodes
+    sources: The source files of all wolo.Source inputs of the nodes
+    The last seen state (mtime and size) of every file is cached, so a poll needs a single stat call per file.
+    """
+    def __init__(self, nodes):
+        self.files = set()
+        self.sources = set()
+        for node in nodes:
+            self.files |= node.inputs | node.outputs
+            self.sources |= _source_paths(node.step)
+        self._states = {path: _file_state(path) for path in self.files | self.sources}
+
+    def poll(self):
+        """Return the files and the source files, which changed since the last poll."""
+        changed = set()
+        for path, state in self._states.items():
+            new_state = _file_state(path)
+            if new_state != state:
+                self._states[path] = new_state
+                changed.add(path)
+        return changed & self.files, changed & self.sources
+
+    def refresh(self, paths):
+        """Accept the current state of paths without reporting them as changed."""
+        for path in paths:
+            self._states[path] = _file_state(path)
+
+
+def _file_state(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _source_paths(step):
+    """Return the paths of the source files of all wolo.Source inputs of a Task or of all Tasks in a Workflow"""
+    steps = _iter_workflow_steps(step) if isinstance(step, Workflow) else [step]
+    paths = set()
+    for task in steps:
+        for para in getattr(task, "inputs", None) or []:
+            if isinstance(para, Source):
+                file_state = _source_file_state(para.object)
+                if file_state is not None:
+                    paths.add(file_state[0])
+    return paths
+
+
+def _refresh(step):
+    """Update the parameters of a Task (or of all Tasks in a Workflow) to the current state of their files."""
+    steps = _iter_workflow_steps(step) if isinstance(step, Workflow) else [step]
+    for task in steps:
+        for para_dic in (getattr(task, "inputs", None), getattr(task, "outputs", None)):
+            if para_dic:
+                for para in para_dic:
+                    para._update()
+
+
+def _run_node(step, task_log, index, context=None):
+    """Run a single _Node of the dag scheduler. Needs to be importable to work with Multiprocess."""
+    if isinstance(step, Workflow):
+        return step.run(return_result=True, _start_level=index, _context=context)
+    return _run_single_task(step, task_log, index, context)
+
+
+def _plan_node(step, task_log, index, threads, log_dic=None):
+    """Update the parameters of a single _Node and return its plan. Used by Workflow.plan()."""
+    if isinstance(step, Workflow):
+        return step.plan(threads=threads, _start_level=index)
+    with use_log_dic(log_dic):
+        if step._pending_before is not None:
+            asyncio.run(step._asetup())
+        _refresh(step)
+    reasons = step._rerun_reasons(task_log)
+    if not reasons:
+        return {}
+    return {pretty_print_index(index, style="underscore"): (type(step).__name__, reasons)}
+
+
+def _run_dag(task_list, log, level=[], context=None):
+    """Run all tasks of a tasktree based on their file dependencies and return the log and success information.
+
+    The dependencies are inferred by matching the wolo.File outputs of a task to the wolo.File inputs of all tasks
+    that come later in the tasktree. Every task is started as soon as all its predecessors finished successfully.
+    Of all tasks that are ready, the ones with the longest remaining path (based on the execution_time in the log)
+    are started first.
+    Tasks that depend on a failed task are not run and keep their old TaskLog. All independent tasks are always
+    finished, so the dag scheduler behaves like keep_going=True.
+    """
+    log, nodes = _collect_nodes(task_list, log, level)
+    _link_nodes(nodes)
+    _rank_nodes(nodes)
+    finished = queue.Queue()
+    ready = [node for node in nodes if node.num_predecessors == 0]
+    num_running = 0
+    finished_nodes = set()
+    success = True
+
+    executor = context.executor if context else None
+
+    def submit(node):
+        args = (node.step, node.task_log, node.index, context)
+        if executor is None:
+            finished.put((node, True, _run_node(*args)))
+        else:
+            executor.apply_async(_run_node, args, callback=lambda result: finished.put((node, True, result)),
+                                 error_callback=lambda error: finished.put((node, False, error)))
+
+    while ready or num_running:
+        # Nodes on the critical path (the longest remaining path) are started first
+        for node in sorted(ready, key=lambda node: -node.rank):
+            submit(node)
+            num_running += 1
+        ready = []
+        node, no_error, result = finished.get()
+        num_running -= 1
+        finished_nodes.add(node)
+        if no_error is False:
+            raise result
+        node_success, node.container[node.position] = result
+        if node_success is False:
+            success = False
+            if context and context.failures is not None:
+                # Results of worker processes are only visible here
+                context.failures.add("failed", node.index, node.step)
+            continue
+        for successor in node.successors:
+            successor.num_predecessors -= 1
+            if successor.num_predecessors == 0:
+                ready.append(successor)
+
+    if len(finished_nodes) < len(nodes):
+        print("{} tasks were not run, because they depend on failed tasks".format(len(nodes) - len(finished_nodes)))
+        success = False
+        if context and context.failures is not None:
+            for node in nodes:
+                if node not in finished_nodes:
+                    context.failures.add("skipped", node.index, node.step)
+    return success, log